@@ -5,39 +5,589 @@ AGI Knowledge Search API - Lightweight HTTP server.
 Provides REST API for searching the AGI knowledge base.
 
 Usage:
-    python api.py [--port 8420] [--host 0.0.0.0]
+    python api.py [--port 8420] [--host 0.0.0.0] [--workers N] [--timeout SECONDS]
+                  [--upstream-timeout SECONDS]
 
 Endpoints:
-    GET  /search?q=QUERY&type=TYPE&limit=N&semantic=0|1
+    GET  /search?q=QUERY&type=TYPE&date_after=YYYY-MM-DD&limit=N&mode=fulltext|semantic|hybrid
+                [&nprobe=N&ef_search=N]     (semantic=1 is the same as mode=semantic)
+    GET  /search?cursor=CURSOR[&limit=N]     (next page of an earlier search)
+    GET  /similar?path=PATH&type=TYPE&date_after=YYYY-MM-DD&limit=N
+    GET  /suggest?prefix=PREFIX&limit=N&kind=title|tag
+    POST /search/batch   {"queries": [{"q": ..., "mode": ..., "type": ..., "limit": ...}, ...]}
     GET  /status
     GET  /stats
+
+The FAISS index, its metadata, the BM25 full-text index and the extracted
+text of every document are loaded once at startup and swapped out when the index files change on disk
+or the corpus manifest (refreshed every few seconds) sees a document added, changed or removed, so
+new files are searchable by full text and /suggest before they are embedded. A reload keeps the text
+of unchanged documents, takes the rest from the text store and re-indexes only changed files for BM25.
+Query embeddings are cached in memory and on disk; /stats reports the hit rate.
+
+Searches are answered from a ResponseCache, an LRU of ranked results keyed by
+the normalized query, mode, filters and index generation. Everything a search
+reads is part of the snapshot of one generation, so entries stay valid until
+the next generation is published, which drops them all. /stats is built once
+per generation from the totals the indexer records in the store settings.
+/suggest completes titles and tags from the snapshot's SuggestIndex
+(suggest.py), built with the corpus manifest during indexing.
+
+Requests are served by a fixed pool of worker threads over HTTP/1.1 keep-alive
+connections, so a query waiting on the embedding API does not hold up others.
+Idle keep-alive connections wait in a selector rather than on a worker.
+Responses are compact JSON (`pretty=1` to indent), gzip- or deflate-compressed
+when the client accepts it and the body is larger than GZIP_MIN_BYTES.
+
+/search returns a `next_cursor` while more results may follow. A search ranks
+PREFETCH_PAGES pages up front and keeps the ranked list, with the snapshot it
+came from, in a ResultCache for CURSOR_TTL seconds: following a cursor is a
+slice of that list, and a page past its end re-ranks deeper against the same
+snapshot (the query embedding is cached) and appends only documents not
+already listed. With `Accept: application/x-ndjson` (or `format=ndjson`)
+/search streams one result per line, each sent and flushed as it is
+serialized, followed by a summary line with `total` and `next_cursor`.
 """
 
 import argparse
+import gzip
 import json
 import os
+import secrets
+import selectors
+import socket
 import sys
 import threading
+import time
+import zlib
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from pathlib import Path
+from typing import Iterable, Optional
 from urllib.parse import urlparse, parse_qs
 
 # Add scripts dir to path
 SCRIPT_DIR = Path(__file__).parent
 sys.path.insert(0, str(SCRIPT_DIR))
 
+from embeddings import default_query_cache, normalize_query, EMBED_TIMEOUT
+from fulltext import FullTextIndex, FULLTEXT_INDEX_FILE
+from manifest import Manifest
+from suggest import SuggestIndex, DEFAULT_LIMIT as SUGGEST_LIMIT, KINDS as SUGGEST_KINDS
+from metastore import MetadataStore, METADATA_DB
 from search import (
-    find_markdown_files, search_in_file, semantic_search,
-    MEMORY_DOCS, DATA_PAPERS, DATA_X
+    fulltext_search, semantic_search, hybrid_search, batch_search, similar_search,
+    load_faiss_store, EmbeddingMatrix, get_gemini_api_key, get_query_embedding,
+    default_text_store, extract_text,
+    store_dir, INDEX_DIR, INDEX_FILE, METADATA_FILE, SHARDS_DIR, WORKSPACE
 )
 
-WORKSPACE = Path("/config/.openclaw/workspace")
+
+class KnowledgeStore:
+    """FAISS index, metadata and document text kept resident for the server.
+
+    The whole set is loaded into a snapshot dict and replaced in one assignment
+    when the index generation on disk changes, so in-flight requests keep using
+    the snapshot they started with.
+    """
+
+    CHECK_INTERVAL = 2.0  # seconds between on-disk generation checks
+
+    def __init__(self, index_dir: Path = INDEX_DIR):
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._matrix_lock = threading.Lock()
+        self._manifest_lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._manifest = None
+        self._manifest_at = 0.0
+
+    def manifest(self) -> Manifest:
+        """Resident corpus manifest, refreshed at most every CHECK_INTERVAL seconds."""
+        with self._manifest_lock:
+            if self._manifest is None:
+                self._manifest = Manifest.load()
+            if self._manifest_at == 0.0 or time.monotonic() - self._manifest_at >= self.CHECK_INTERVAL:
+                self._manifest.refresh()
+                self._manifest_at = time.monotonic()
+                if self._manifest.dirty:
+                    try:
+                        self._manifest.save()
+                    except OSError as e:
+                        sys.stderr.write(f"⚠️ Could not save manifest: {e}\n")
+                    self._manifest.dirty = False
+            return self._manifest
+
+    def generation(self) -> tuple:
+        """Identify what a snapshot is built from: the index files (see `_file_generation`) and the
+        version of the corpus manifest, so added, changed and removed documents are picked up too."""
+        return (*self._file_generation(), self.manifest().version)
+
+    def _file_generation(self) -> tuple:
+        """The published index generation's directory and the mtime and size of its files and of the
+        full-text index."""
+        directory = store_dir(self.index_dir)
+        gen = [str(directory)]
+        for path in (directory / INDEX_FILE, directory / METADATA_DB, FULLTEXT_INDEX_FILE):
+            try:
+                st = path.stat()
+                gen.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                gen.append(None)
+        return tuple(gen)
+
+    def snapshot(self) -> dict:
+        """Return the current snapshot, reloading it if the index generation changed."""
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - self._checked_at < self.CHECK_INTERVAL:
+            return snap
+
+        # Only one thread checks/reloads; the others keep serving the old snapshot.
+        if not self._lock.acquire(blocking=snap is None):
+            return snap
+        try:
+            self._checked_at = time.monotonic()
+            generation = self.generation()
+            if self._snapshot is None or self._snapshot["generation"] != generation:
+                self._snapshot = self._load(generation, self._snapshot)
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+    def embedding_matrix(self, snap: dict, api_key: str) -> EmbeddingMatrix:
+        """Fallback embedding matrix of a snapshot without FAISS index, built on first use."""
+        if snap.get("matrix") is None:
+            with self._matrix_lock:
+                if snap.get("matrix") is None:
+                    snap["matrix"] = EmbeddingMatrix(snap["documents"], api_key)
+        return snap["matrix"]
+
+    def _documents(self, files: dict[str, dict], previous: Optional[dict]) -> list[tuple[Path, dict, str]]:
+        """(path, metadata, plain text) of the manifest's `files`.
+
+        Text is reused from the previous snapshot when the content hash is
+        unchanged, else taken from the text store when it holds the same hash,
+        and only otherwise extracted from the file (new or not yet indexed).
+        Metadata is the title and date the manifest records.
+        """
+        known = previous["hashes"] if previous else {}
+        stored = None
+        documents = []
+        for key in sorted(files):
+            entry, f = files[key], WORKSPACE / key
+            text = previous["texts"].get(key) if known.get(key) == entry["hash"] else None
+            if text is None:
+                if stored is None:
+                    stored = default_text_store().hashes()
+                if stored.get(key) == entry["hash"]:
+                    text = default_text_store().get_path(key)
+            if text is None:
+                try:
+                    text = extract_text(f.read_text(encoding="utf-8"))
+                except Exception:
+                    continue
+            metadata = {"title": entry["title"], **({"date": entry["date"]} if entry["date"] else {})}
+            documents.append((f, metadata, text))
+        return documents
+
+    def _load(self, generation: tuple, previous: Optional[dict] = None) -> dict:
+        """Load index, metadata and document text into a new snapshot, reusing what `previous` holds."""
+        started = time.monotonic()
+        try:
+            index, vector_map = load_faiss_store(self.index_dir)
+        except Exception as e:
+            sys.stderr.write(f"⚠️ Failed to load FAISS index: {e}\n")
+            index, vector_map = None, None
+
+        manifest = self.manifest()
+        with self._manifest_lock:
+            files = dict(manifest.files)
+            suggest = manifest.suggest()
+            generation = (*generation[:-1], manifest.version)
+        documents = self._documents(files, previous)
+        texts = {str(f.relative_to(WORKSPACE)): text for f, _, text in documents}
+
+        # Only documents whose file changed since the full-text index saw them are re-indexed
+        fulltext = FullTextIndex.load()
+        changed = 0
+        for f, metadata, text in documents:
+            key = str(f.relative_to(WORKSPACE))
+            entry = files[key]
+            stat = (entry["mtime"], entry["size"])
+            doc_id = fulltext.path_ids.get(key)
+            if doc_id is None or fulltext.docs[doc_id]["stat"] != stat:
+                changed += fulltext.update_document(f, metadata, text, stat)
+        for path_key in [p for p in fulltext.path_ids if p not in texts]:
+            changed += fulltext.remove_document(path_key)
+        if changed:
+            try:
+                fulltext.save()
+                generation = (*self._file_generation(), generation[-1])  # our own write is not a new generation
+            except OSError as e:
+                sys.stderr.write(f"⚠️ Could not save full-text index: {e}\n")
+        elapsed = (time.monotonic() - started) * 1000
+        sys.stderr.write(
+            f"📦 Loaded {len(documents)} documents ({changed} re-indexed), "
+            f"{index.ntotal if index is not None else 0} vectors in {elapsed:.0f}ms\n"
+        )
+        return {
+            "generation": generation,
+            "stats": self._stats(vector_map),
+            "suggest": suggest,
+            "index": index,
+            "vector_map": vector_map,
+            "documents": documents,
+            "texts": texts,
+            "hashes": {key: files[key]["hash"] for key in texts},
+            "fulltext": fulltext,
+            "matrix": None,  # EmbeddingMatrix, built on first fallback query
+            "loaded": datetime.now().isoformat(),
+        }
+
+    def _stats(self, vector_map) -> dict:
+        """The /stats totals of a generation, from the counters vector_store.py records in its settings.
+
+        Stores written before the counters existed fall back to the corpus manifest.
+        """
+        directory = store_dir(self.index_dir)
+        meta = {}
+        try:
+            if vector_map is not None and vector_map.db is not None:
+                meta = vector_map.db.settings
+            elif (directory / METADATA_DB).exists():
+                db = MetadataStore(directory / METADATA_DB)
+                meta = db.settings
+                db.close()
+            elif (directory / METADATA_FILE).exists():
+                meta = json.loads((directory / METADATA_FILE).read_text())
+        except Exception:
+            pass
+        types = meta.get("type_counts") or self.manifest().type_counts()
+        index_info = {
+            "total_documents": meta.get("total_documents", 0),
+            "duplicate_documents": meta.get("duplicate_documents", 0),
+            "total_vectors": meta.get("total_vectors", 0),
+            "dimension": meta.get("dimension", 0),
+            "created": meta.get("created", ""),
+            "updated": meta.get("updated", ""),
+            "shard_by": meta.get("shard_by"),
+            "shards": meta.get("shard_vectors") or meta.get("shards", []),
+        } if meta else {}
+        return {
+            "documents": {
+                "reports": types.get("report", 0),
+                "papers": types.get("paper", 0),
+                "posts": types.get("post", 0),
+                "total": sum(types.values()),
+            },
+            "index": index_info,
+            "faiss_exists": (directory / INDEX_FILE).exists() or (directory / SHARDS_DIR).is_dir(),
+        }
+
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+DEFAULT_TIMEOUT = 30.0       # seconds a connection may sit idle or mid-request
+GZIP_MIN_BYTES = 1024
+MAX_BATCH_QUERIES = 100      # one batchEmbedContents request
+MAX_BODY_BYTES = 1 << 20
+MAX_LIMIT = 100             # results per search (or page)
+MAX_SEARCH_KNOB = 4096      # nprobe / ef_search
+CURSOR_TTL = 300.0          # seconds a search's ranked results stay pageable after last use
+MAX_CURSORS = 1024          # pageable searches; the least recently used are evicted
+MAX_CACHED_SEARCHES = 512   # ResponseCache entries per generation
+PREFETCH_PAGES = 2          # pages ranked by the first request, so the second page needs no search
+MAX_PAGE_DEPTH = 1000       # results reachable by following cursors
+NDJSON = "application/x-ndjson"
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that serves requests on a fixed-size thread pool.
+
+    Unlike ThreadingHTTPServer the number of threads is bounded, and a worker
+    is taken only while a request is read and answered. Between requests a
+    keep-alive connection is parked in a selector watched by one thread and
+    goes back to the pool when its next request arrives, so idle connections
+    (a browser keeps up to six open) cost a file descriptor, not a worker.
+    Parked connections are closed after the handler timeout.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers: int = DEFAULT_WORKERS):
+        super().__init__(server_address, handler_class)
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+        self._closing = False
+        self._parked = deque()  # handlers handed to the idle thread, which owns the selector
+        self._idle = selectors.DefaultSelector()
+        self._wake, self._waker = socket.socketpair()
+        self._wake.setblocking(False)
+        self._idle.register(self._wake, selectors.EVENT_READ)
+        threading.Thread(target=self._watch_idle, name="search-idle", daemon=True).start()
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._open, request, client_address)
+
+    def _open(self, request, client_address):
+        # BaseRequestHandler.__init__ would serve the whole connection; set the handler up for one request at a time
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        handler.request, handler.client_address, handler.server = request, client_address, self
+        try:
+            handler.setup()
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        self._serve(handler)
+
+    def _serve(self, handler):
+        """Answer the requests a connection has sent, then park it or close it."""
+        try:
+            while not self._closing:
+                handler.close_connection = True
+                handler.handle_one_request()
+                if handler.close_connection:
+                    break
+                if not self._pipelined(handler):
+                    handler.idle_since = time.monotonic()
+                    self._parked.append(handler)
+                    self._waker.send(b"\0")
+                    return
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+        self._close(handler)
+
+    @staticmethod
+    def _pipelined(handler) -> bool:
+        """Whether the next request is already in the handler's read buffer (the selector would not see it)."""
+        handler.connection.settimeout(0)
+        try:
+            return bool(handler.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            handler.connection.settimeout(handler.timeout)
+
+    def _close(self, handler):
+        try:
+            handler.finish()
+        except Exception:
+            pass
+        self.shutdown_request(handler.request)
+
+    def _watch_idle(self):
+        while not self._closing:
+            for key, _ in self._idle.select(timeout=1.0):
+                if key.data is None:
+                    try:
+                        self._wake.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._idle.unregister(key.fileobj)
+                try:
+                    self.pool.submit(self._serve, key.data)
+                except RuntimeError:  # pool shut down
+                    self._close(key.data)
+            while self._parked:
+                handler = self._parked.popleft()
+                self._idle.register(handler.connection, selectors.EVENT_READ, handler)
+            expired = time.monotonic() - (self.RequestHandlerClass.timeout or DEFAULT_TIMEOUT)
+            for key in list(self._idle.get_map().values()):
+                if key.data is not None and key.data.idle_since < expired:
+                    self._idle.unregister(key.fileobj)
+                    self._close(key.data)
+        for key in list(self._idle.get_map().values()):
+            if key.data is not None:
+                self._close(key.data)
+        self._idle.close()
+
+    def server_close(self):
+        super().server_close()
+        self._closing = True
+        self._waker.send(b"\0")
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def encode_body(body: bytes, accept_encoding: str) -> tuple[bytes, str]:
+    """Compress a response body for the client's Accept-Encoding. Returns (body, encoding or "")."""
+    if len(body) < GZIP_MIN_BYTES:
+        return body, ""
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    if "deflate" in accepted:
+        return zlib.compress(body, 5), "deflate"
+    return body, ""
+
+
+def stream_compressor(accept_encoding: str):
+    """(zlib compressobj or None, encoding or "") for a streamed body."""
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if "gzip" in accepted:
+        return zlib.compressobj(5, zlib.DEFLATED, 16 + zlib.MAX_WBITS), "gzip"
+    if "deflate" in accepted:
+        return zlib.compressobj(5), "deflate"
+    return None, ""
+
+
+class ResultCache:
+    """Ranked results of recent searches, addressed by cursor tokens.
+
+    An entry is a dict holding the search ("query", "mode", "args"), the
+    snapshot it ran against, its ranked "results" so far and whether they are
+    "complete". Entries expire `ttl` seconds after their last use; beyond
+    `max_entries` the least recently used are evicted.
+    """
+
+    def __init__(self, ttl: float = CURSOR_TTL, max_entries: int = MAX_CURSORS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()  # token -> (expires, entry), in expiry order
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float):
+        while self._entries:
+            token, (expires, _) = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            del self._entries[token]
+
+    def put(self, entry: dict) -> str:
+        token = secrets.token_urlsafe(12)
+        now = time.monotonic()
+        entry.setdefault("lock", threading.Lock())
+        with self._lock:
+            self._expire(now)
+            self._entries[token] = (now + self.ttl, entry)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return token
+
+    def get(self, token: str) -> Optional[dict]:
+        """The entry of a token, or None if it is unknown or expired. Renews its lifetime."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            item = self._entries.pop(token, None)
+            if item is None:
+                return None
+            self._entries[token] = (now + self.ttl, item[1])
+            return item[1]
+
+
+class ResponseCache:
+    """LRU of search entries (see ResultCache) of the current index generation.
+
+    Keys are built by `search_key`. A lookup or insert under a generation other
+    than the one the cache holds drops every entry first. Thread-safe.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_SEARCHES):
+        self.max_entries = max_entries
+        self.generation = None
+        self.hits = self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _switch(self, generation: tuple):
+        if generation != self.generation:
+            self._entries.clear()
+            self.generation = generation
+
+    def get(self, generation: tuple, key: tuple) -> Optional[dict]:
+        with self._lock:
+            self._switch(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, generation: tuple, key: tuple, entry: dict):
+        with self._lock:
+            self._switch(generation)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+def search_key(query: str, mode: str, args: argparse.Namespace) -> tuple:
+    """ResponseCache key of a search: spellings that normalize alike share an entry."""
+    return (normalize_query(query), mode, args.type, args.date_after, args.limit, args.nprobe, args.ef_search)
+
+
+def make_cursor(token: str, offset: int) -> str:
+    return f"{token}.{offset}"
+
+
+def parse_cursor(cursor: str) -> tuple[str, int]:
+    token, _, offset = cursor.rpartition(".")
+    if not token or not offset.isdigit():
+        raise ValueError("Malformed cursor")
+    return token, int(offset)
+
+
+def int_param(params: dict, name: str, default: Optional[int], maximum: int) -> Optional[int]:
+    """Integer parameter in [1, maximum], or `default` if absent. Raises ValueError otherwise."""
+    value = params.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+    if not 1 <= value <= maximum:
+        raise ValueError(f"{name} must be between 1 and {maximum}")
+    return value
+
+
+def search_request(params: dict) -> tuple[str, str, argparse.Namespace]:
+    """(query, mode, args) from one search's parameters (query string or batch entry)."""
+    query = params.get("q")
+    if not query:
+        raise ValueError("Missing query parameter 'q'")
+    mode = params.get("mode") or ("semantic" if params.get("semantic") in ("1", 1, True) else "fulltext")
+    if mode not in ("fulltext", "semantic", "hybrid"):
+        raise ValueError(f"Unknown mode '{mode}'")
+    args = argparse.Namespace(
+        type=params.get("type"),
+        date_after=params.get("date_after"),
+        limit=int_param(params, "limit", 10, MAX_LIMIT),
+        nprobe=int_param(params, "nprobe", None, MAX_SEARCH_KNOB),
+        ef_search=int_param(params, "ef_search", None, MAX_SEARCH_KNOB),
+    )
+    return str(query), mode, args
 
 
 class SearchHandler(BaseHTTPRequestHandler):
     """HTTP request handler for search API."""
 
+    protocol_version = "HTTP/1.1"   # keep-alive; every response sets Content-Length
+    disable_nagle_algorithm = True  # headers and body are separate writes; don't wait for the ACK in between
+    timeout = DEFAULT_TIMEOUT
+    store: KnowledgeStore = None
+    cursors: ResultCache = None
+    response_cache: ResponseCache = None
+
     def log_message(self, format, *args):
         """Suppress default logging."""
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -45,11 +595,42 @@ class SearchHandler(BaseHTTPRequestHandler):
 
     def _send_json(self, data, status=200):
         """Send JSON response."""
+        pretty = parse_qs(urlparse(self.path).query).get("pretty") == ["1"]
+        body = json.dumps(data, ensure_ascii=False, indent=2 if pretty else None,
+                          separators=None if pretty else (",", ":")).encode("utf-8")
+        body, encoding = encode_body(body, self.headers.get("Accept-Encoding", ""))
         self.send_response(status)
         self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_ndjson(self, rows: Iterable[dict]):
+        """Stream rows as newline-delimited JSON in chunked transfer encoding, one flushed chunk per row."""
+        compressor, encoding = stream_compressor(self.headers.get("Accept-Encoding", ""))
+        self.send_response(200)
+        self.send_header("Content-Type", f"{NDJSON}; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept, Accept-Encoding")
         self.send_header("Access-Control-Allow-Origin", "*")
         self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8"))
+
+        def write_chunk(data: bytes):
+            if data:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+        for row in rows:
+            line = json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            write_chunk(compressor.compress(line) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else line)
+        if compressor:
+            write_chunk(compressor.flush())
+        self.wfile.write(b"0\r\n\r\n")
 
     def _send_error(self, message, status=400):
         """Send error response."""
@@ -62,6 +643,10 @@ class SearchHandler(BaseHTTPRequestHandler):
 
         if parsed.path == "/search":
             self._handle_search(params)
+        elif parsed.path == "/similar":
+            self._handle_similar(params)
+        elif parsed.path == "/suggest":
+            self._handle_suggest(params)
         elif parsed.path == "/status":
             self._handle_status()
         elif parsed.path == "/stats":
@@ -69,61 +654,207 @@ class SearchHandler(BaseHTTPRequestHandler):
         else:
             self._send_error("Not found", 404)
 
+    def do_POST(self):
+        """Handle POST requests."""
+        parsed = urlparse(self.path)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY_BYTES:
+            self._send_error("Missing or oversized request body", 413 if length > MAX_BODY_BYTES else 411)
+            return
+        body = self.rfile.read(length)
+
+        if parsed.path == "/search/batch":
+            self._handle_batch(body)
+        else:
+            self._send_error("Not found", 404)
+
     def do_OPTIONS(self):
         """Handle CORS preflight."""
         self.send_response(204)
         self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
         self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
     def _handle_search(self, params):
-        """Handle search requests."""
-        query = params.get("q", [None])[0]
-        if not query:
-            self._send_error("Missing query parameter 'q'")
+        """Handle search requests: a new search, or the next page of one (`cursor`)."""
+        params = {k: v[0] for k, v in params.items()}
+        try:
+            if params.get("cursor"):
+                token, offset = parse_cursor(params["cursor"])
+                entry = self.cursors.get(token)
+                if entry is None:
+                    self._send_error("Cursor expired; repeat the search", 410)
+                    return
+                limit = int_param(params, "limit", entry["args"].limit, MAX_LIMIT)
+                query = entry["query"]
+            else:
+                query, mode, args = search_request(params)
+                snap = self.store.snapshot()
+                key = search_key(query, mode, args)
+                entry = self.response_cache.get(snap["generation"], key)
+                if entry is None:
+                    depth = min(args.limit * PREFETCH_PAGES, MAX_PAGE_DEPTH)
+                    results, exact = self._search(snap, query, mode, argparse.Namespace(**{**vars(args), "limit": depth}))
+                    entry = {"query": query, "mode": mode, "args": args, "snap": snap,
+                             "results": results, "complete": len(results) < depth}
+                    if exact:
+                        self.response_cache.put(snap["generation"], key, entry)
+                token, offset, limit = entry.get("token"), 0, args.limit
+        except ValueError as e:
+            self._send_error(str(e))
             return
 
-        limit = int(params.get("limit", ["10"])[0])
-        search_type = params.get("type", [None])[0]
-        use_semantic = params.get("semantic", ["0"])[0] == "1"
-
-        # Collect files
-        all_files = []
-        all_files.extend(find_markdown_files(MEMORY_DOCS))
-        all_files.extend(find_markdown_files(DATA_PAPERS))
-        all_files.extend(find_markdown_files(DATA_X))
-
-        # Build args namespace
-        import argparse
-        args = argparse.Namespace(
-            type=search_type,
-            date_after=None,
-            limit=limit,
-        )
+        page, more = self._page(entry, offset, limit)
+        next_cursor = None
+        if more:
+            if token is None or self.cursors.get(token) is None:
+                token = entry["token"] = self.cursors.put(entry)
+            next_cursor = make_cursor(token, offset + len(page))
 
-        if use_semantic:
-            from search import get_gemini_api_key
-            api_key = get_gemini_api_key()
-            if api_key:
-                results = semantic_search(query, all_files, args, api_key)
-            else:
-                results = []
+        summary = {
+            "query": query,
+            "total": len(page),
+            "offset": offset,
+            "mode": entry["mode"],
+            "semantic": entry["mode"] == "semantic",
+            "next_cursor": next_cursor,
+        }
+        if NDJSON in self.headers.get("Accept", "") or params.get("format") == "ndjson":
+            self._send_ndjson([*page, summary])
+        else:
+            self._send_json({**summary, "results": page})
+
+    def _page(self, entry: dict, offset: int, limit: int) -> tuple[list[dict], bool]:
+        """(results[offset:offset + limit] of a search, whether more may follow), ranking deeper if needed."""
+        with entry.setdefault("lock", threading.Lock()):
+            results = entry["results"]
+            end = min(offset + limit, MAX_PAGE_DEPTH)
+            while end > len(results) and not entry["complete"]:
+                depth = min(max(2 * len(results), end), MAX_PAGE_DEPTH)
+                args = argparse.Namespace(**{**vars(entry["args"]), "limit": depth})
+                deeper, _ = self._search(entry["snap"], entry["query"], entry["mode"], args)
+                # Pages already served stay as they were; only new documents are appended
+                listed = {r["path"] for r in results}
+                results.extend(r for r in deeper if r["path"] not in listed)
+                entry["complete"] = len(deeper) < depth or depth >= MAX_PAGE_DEPTH
+            return results[offset:end], end < len(results) or (end < MAX_PAGE_DEPTH and not entry["complete"])
+
+    def _search(self, snap: dict, query: str, mode: str, args: argparse.Namespace) -> tuple[list[dict], bool]:
+        """(ranked results of one search against a snapshot, up to `args.limit`, whether they are exact).
+
+        Results are not exact when the query embedding was unavailable (no API
+        key, rate limits), so a semantic or hybrid search ran on BM25 alone or not at all.
+        """
+        if mode == "fulltext":
+            return fulltext_search(query, [], args, index=snap["fulltext"], texts=snap["texts"])[:args.limit], True
+
+        api_key = get_gemini_api_key()
+        embedding = get_query_embedding(query, api_key) if api_key else None
+        all_files = [f for f, _, _ in snap["documents"]]
+        matrix = None
+        if embedding and snap["index"] is None:
+            matrix = self.store.embedding_matrix(snap, api_key)
+
+        if mode == "hybrid":
+            results = hybrid_search(
+                query, all_files, args, api_key if embedding else None, fulltext_index=snap["fulltext"],
+                texts=snap["texts"], matrix=matrix, query_embedding=embedding,
+                index=snap["index"], vector_map=snap["vector_map"],
+            )
         else:
             results = []
-            for f in all_files:
-                r = search_in_file(f, query, args)
-                if r:
-                    results.append(r)
-            results.sort(key=lambda x: x["score"], reverse=True)
+            if embedding:
+                results = semantic_search(
+                    query, all_files, args, api_key, matrix=matrix, query_embedding=embedding,
+                    index=snap["index"], vector_map=snap["vector_map"], texts=snap["texts"],
+                )
+        return results[:args.limit], embedding is not None
+
+    def _handle_similar(self, params):
+        """Handle "more like this" requests; uses stored vectors, no embedding call."""
+        params = {k: v[0] for k, v in params.items()}
+        path = params.pop("path", None)
+        if not path:
+            self._send_error("Missing query parameter 'path'")
+            return
+        try:
+            _, _, args = search_request({**params, "q": path})
+        except ValueError as e:
+            self._send_error(str(e))
+            return
 
-        results = results[:limit]
+        snap = self.store.snapshot()
+        matrix = None
+        if snap["index"] is None:
+            api_key = get_gemini_api_key()
+            if api_key:
+                matrix = self.store.embedding_matrix(snap, api_key)
+        results = similar_search(
+            path, [f for f, _, _ in snap["documents"]], args, matrix=matrix, texts=snap["texts"],
+            index=snap["index"], vector_map=snap["vector_map"],
+        )
+        if results is None:
+            self._send_error(f"Document not indexed: {path}", 404)
+            return
+        self._send_json({"path": path, "total": len(results), "results": results})
+
+    def _handle_suggest(self, params):
+        """Handle autocomplete requests: titles and tags starting with `prefix`."""
+        params = {k: v[0] for k, v in params.items()}
+        prefix = params.get("prefix", "")
+        kind = params.get("kind")
+        try:
+            limit = int(params.get("limit") or SUGGEST_LIMIT)
+        except ValueError:
+            self._send_error("limit must be an integer")
+            return
+        if kind and kind not in SUGGEST_KINDS:
+            self._send_error(f"Unknown kind '{kind}'")
+            return
+        index: SuggestIndex = self.store.snapshot()["suggest"]
+        self._send_json({"prefix": prefix, "suggestions": index.complete(prefix, limit, kind)})
+
+    def _handle_batch(self, body: bytes):
+        """Handle batch search requests: {"queries": [{"q": ..., "mode": ..., "type": ...}, ...]}.
+
+        Top-level keys other than "queries" are defaults for every entry.
+        """
+        try:
+            payload = json.loads(body)
+            entries = payload["queries"]
+            if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+                raise ValueError("'queries' must be a list of objects")
+            if len(entries) > MAX_BATCH_QUERIES:
+                raise ValueError(f"At most {MAX_BATCH_QUERIES} queries per batch")
+            defaults = {k: v for k, v in payload.items() if k != "queries"}
+            queries = [search_request({**defaults, **entry}) for entry in entries]
+        except (KeyError, TypeError, AttributeError):
+            self._send_error("Body must be a JSON object with a 'queries' list")
+            return
+        except ValueError as e:
+            self._send_error(str(e))
+            return
 
+        snap = self.store.snapshot()
+        api_key = get_gemini_api_key() if any(mode != "fulltext" for _, mode, _ in queries) else None
+        matrix = None
+        if api_key and snap["index"] is None:
+            matrix = self.store.embedding_matrix(snap, api_key)
+        results = batch_search(
+            queries, [f for f, _, _ in snap["documents"]], api_key,
+            fulltext_index=snap["fulltext"], texts=snap["texts"], matrix=matrix,
+            index=snap["index"], vector_map=snap["vector_map"],
+        )
         self._send_json({
-            "query": query,
-            "total": len(results),
-            "semantic": use_semantic,
-            "results": results,
+            "results": [
+                {"query": query, "mode": mode, "count": len(found), "results": found}
+                for (query, mode, _), found in zip(queries, results)
+            ],
         })
 
     def _handle_status(self):
@@ -133,39 +864,15 @@ class SearchHandler(BaseHTTPRequestHandler):
             "service": "agi-knowledge-search-api",
             "version": "1.0.0",
             "timestamp": datetime.now().isoformat(),
+            "index_loaded": self.store.snapshot()["loaded"],
         })
 
     def _handle_stats(self):
-        """Handle stats requests."""
-        docs_files = find_markdown_files(MEMORY_DOCS)
-        papers_files = find_markdown_files(DATA_PAPERS)
-        x_files = find_markdown_files(DATA_X)
-
-        index_dir = WORKSPACE / "data/index"
-        faiss_file = index_dir / "knowledge.faiss"
-        metadata_file = index_dir / "metadata.json"
-
-        index_info = {}
-        if metadata_file.exists():
-            try:
-                meta = json.loads(metadata_file.read_text())
-                index_info = {
-                    "total_documents": meta.get("total_documents", 0),
-                    "dimension": meta.get("dimension", 0),
-                    "created": meta.get("created", ""),
-                }
-            except Exception:
-                pass
-
+        """Handle stats requests: the snapshot's totals plus live cache counters."""
         self._send_json({
-            "documents": {
-                "reports": len(docs_files),
-                "papers": len(papers_files),
-                "posts": len(x_files),
-                "total": len(docs_files) + len(papers_files) + len(x_files),
-            },
-            "index": index_info,
-            "faiss_exists": faiss_file.exists(),
+            **self.store.snapshot()["stats"],
+            "query_cache": default_query_cache().stats(),
+            "response_cache": self.response_cache.stats(),
         })
 
 
@@ -173,12 +880,25 @@ def main():
     parser = argparse.ArgumentParser(description="AGI Knowledge Search API")
     parser.add_argument("--port", type=int, default=8420, help="Port (default: 8420)")
     parser.add_argument("--host", default="0.0.0.0", help="Host (default: 0.0.0.0)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Worker threads (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Idle/read timeout per connection in seconds (default: {DEFAULT_TIMEOUT:g})")
+    parser.add_argument("--upstream-timeout", type=float, default=EMBED_TIMEOUT,
+                        help=f"Embedding API timeout in seconds (default: {EMBED_TIMEOUT:g})")
     args = parser.parse_args()
 
-    server = HTTPServer((args.host, args.port), SearchHandler)
+    SearchHandler.store = KnowledgeStore()
+    SearchHandler.cursors = ResultCache()
+    SearchHandler.response_cache = ResponseCache()
+    SearchHandler.store.snapshot()
+    SearchHandler.timeout = args.timeout
+    default_query_cache().timeout = args.upstream_timeout
+
+    server = PooledHTTPServer((args.host, args.port), SearchHandler, max(1, args.workers))
     print(f"🎋 AGI Knowledge Search API")
-    print(f"   Listening on http://{args.host}:{args.port}")
-    print(f"   Endpoints: /search, /status, /stats")
+    print(f"   Listening on http://{args.host}:{args.port} ({server.workers} workers)")
+    print(f"   Endpoints: /search, /search/batch, /similar, /suggest, /status, /stats")
 
     try:
         server.serve_forever()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+AGI Knowledge Search - Markdown chunker
+
+Split markdown into overlapping passages for embedding. Documents are cut at
+headings first and blank-line paragraphs second; paragraphs are packed into
+chunks of up to CHUNK_CHARS plain-text characters, and each chunk repeats the
+tail of the previous one (up to CHUNK_OVERLAP characters) within a section.
+Code fences are never split.
+
+Chunks are returned as (start, end) spans into the document's plain text as
+produced by `search.extract_text`, so callers can show the matching passage
+without storing chunk text.
+
+Usage:
+    python chunker.py <file.md>
+"""
+
+import re
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from search import extract_text
+
+CHUNK_CHARS = 1500
+CHUNK_OVERLAP = 200
+CHUNK_BITS = 12                  # vector id = (doc id << CHUNK_BITS) | chunk number
+MAX_CHUNKS = 1 << CHUNK_BITS
+
+HEADING_RE = re.compile(r"^#{1,6}\s")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+
+def split_blocks(content: str) -> list[tuple[bool, str]]:
+    """Split markdown (without frontmatter) into (is_heading, raw text) blocks."""
+    if content.startswith("---"):
+        parts = content.split("---", 2)
+        if len(parts) >= 3:
+            content = parts[2]
+
+    blocks, current, in_fence = [], [], False
+
+    def flush():
+        if current:
+            blocks.append((False, "\n".join(current)))
+            current.clear()
+
+    for line in content.split("\n"):
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+            current.append(line)
+        elif in_fence:
+            current.append(line)
+        elif HEADING_RE.match(line):
+            flush()
+            blocks.append((True, line))
+        elif not line.strip():
+            flush()
+        else:
+            current.append(line)
+    flush()
+    return blocks
+
+
+def _hard_split(text: str, start: int, end: int, size: int, overlap: int) -> list[tuple[int, int]]:
+    """Cut text[start:end] into spans of at most `size`, breaking at spaces where there are any."""
+    spans = []
+    while start < end:
+        stop = min(end, start + size)
+        if stop < end:
+            space = text.rfind(" ", start + 1, stop + 1)
+            if space > start:
+                stop = space
+        spans.append((start, stop))
+        if stop == end:
+            break
+        # Overlap the next span, starting it on a word boundary like chunk_spans does
+        tail = max(start + 1, stop - overlap)
+        space = text.find(" ", tail, stop)
+        if space >= 0:
+            tail = space + 1
+        while tail < end and text[tail] == " ":
+            tail += 1
+        start = tail
+    return spans
+
+
+def chunk_spans(content: str, plain_text: str = None, size: int = CHUNK_CHARS,
+                overlap: int = CHUNK_OVERLAP) -> list[tuple[int, int]]:
+    """Chunk markdown into (start, end) spans of its plain text."""
+    if plain_text is None:
+        plain_text = extract_text(content)
+
+    # Locate each block's plain text inside the document's plain text
+    pieces, pos = [], 0
+    for is_heading, raw in split_blocks(content):
+        text = extract_text(raw)
+        if not text:
+            continue
+        at = plain_text.find(text, pos)
+        if at < 0:
+            at = min(pos, len(plain_text))
+        pieces.append((is_heading, at, min(at + len(text), len(plain_text))))
+        pos = pieces[-1][2]
+
+    if not pieces:
+        return _hard_split(plain_text, 0, len(plain_text), size, overlap) if plain_text else []
+
+    spans, current = [], []  # current: (start, end, is_heading) pieces of the open chunk
+
+    def close():
+        if current:
+            spans.append((current[0][0], current[-1][1]))
+
+    def headings_only():
+        # A chunk is never just headings: they wait for the text that follows them
+        return bool(current) and all(heading for _, _, heading in current)
+
+    for is_heading, start, end in pieces:
+        if end - start > size:
+            if headings_only():
+                start = current[0][0]  # the heading leads the first piece
+            else:
+                close()
+            current = []
+            spans.extend(_hard_split(plain_text, start, end, size, overlap))
+            continue
+        length = end - current[0][0] if current else 0
+        if current and not headings_only() and (length > size or (is_heading and length > size // 2)):
+            close()
+            # Repeat the tail of the previous chunk as overlap, within a section
+            current = []
+            if not is_heading and overlap:
+                prev_end = spans[-1][1]
+                tail = max(spans[-1][0], prev_end - overlap)
+                space = plain_text.find(" ", tail, prev_end)
+                if space >= 0:
+                    tail = space + 1
+                if tail < prev_end:
+                    current = [(tail, prev_end, False)]
+        current.append((start, end, is_heading))
+    if headings_only() and spans:
+        spans[-1] = (spans[-1][0], current[-1][1])  # trailing headings join the last chunk
+    else:
+        close()
+    return spans[:MAX_CHUNKS]
+
+
+def chunk_texts(content: str, plain_text: str = None, title: str = "") -> tuple[list[tuple[int, int]], list[str]]:
+    """Spans plus the text to embed for each chunk (prefixed with the title for context)."""
+    if plain_text is None:
+        plain_text = extract_text(content)
+    spans = chunk_spans(content, plain_text)
+    prefix = f"{title}\n" if title else ""
+    return spans, [prefix + plain_text[s:e] for s, e in spans]
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__); return
+    content = Path(sys.argv[1]).read_text(encoding="utf-8")
+    plain = extract_text(content)
+    spans = chunk_spans(content, plain)
+    print(f"📄 {len(plain)} chars → {len(spans)} chunks")
+    for i, (s, e) in enumerate(spans):
+        print(f"  [{i}] {s}-{e}: {plain[s:s + 80]}...")
+
+
+if __name__ == "__main__":
+    main()
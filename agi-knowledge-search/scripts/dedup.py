@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+AGI Knowledge Search - Near-duplicate detection
+
+The same tweet saved by several skills, or a paper note re-saved once per
+category, should be embedded once and shown once. Each document gets a 64-bit
+SimHash of its word 3-gram shingles (fulltext.tokenize terms, so CJK text is
+shingled by character bigrams); two documents whose signatures differ in at
+most MAX_DISTANCE bits are near-duplicates.
+
+`SimHashIndex` finds a near-duplicate without comparing against every
+document: the signature is split into MAX_DISTANCE + 1 bands, and two
+signatures within MAX_DISTANCE bits agree exactly on at least one band, so
+only documents sharing a band value are compared.
+
+Documents shorter than MIN_TOKENS terms get no signature and are never
+treated as duplicates (empty or title-only notes would all collide).
+
+Usage:
+    python dedup.py
+"""
+
+import argparse
+import hashlib
+import sys
+from pathlib import Path
+from typing import Callable, Hashable, Iterable, Optional
+
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from fulltext import tokenize
+
+BITS = 64
+MAX_DISTANCE = 3
+SHINGLE = 3
+MIN_TOKENS = 20
+BANDS = MAX_DISTANCE + 1
+BAND_BITS = BITS // BANDS
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash of a plain text, or None if it is too short to compare."""
+    return signature(tokenize(text))
+
+
+def signature(terms: list[str]) -> Optional[int]:
+    """`simhash` of already tokenized text."""
+    if len(terms) < MIN_TOKENS:
+        return None
+    shingles = {" ".join(terms[i:i + SHINGLE]) for i in range(len(terms) - SHINGLE + 1)}
+    # One 64-character bit string per shingle; columns are tallied in C by str.count
+    bits = [format(int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big"), "064b")
+            for s in shingles]
+    half = len(bits) / 2
+    return int("".join("1" if column.count("1") > half else "0" for column in zip(*bits)), 2)
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def is_near(a: Optional[int], b: Optional[int], max_distance: int = MAX_DISTANCE) -> bool:
+    return a is not None and b is not None and distance(a, b) <= max_distance
+
+
+class SimHashIndex:
+    """Signatures by key with banded lookup of a near-duplicate."""
+
+    def __init__(self):
+        self.signatures: dict[Hashable, int] = {}
+        self._bands: list[dict[int, list]] = [{} for _ in range(BANDS)]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.signatures
+
+    @staticmethod
+    def _band_values(signature: int) -> Iterable[tuple[int, int]]:
+        mask = (1 << BAND_BITS) - 1
+        return ((band, (signature >> (band * BAND_BITS)) & mask) for band in range(BANDS))
+
+    def add(self, key: Hashable, signature: int):
+        self.signatures[key] = signature
+        for band, value in self._band_values(signature):
+            self._bands[band].setdefault(value, []).append(key)
+
+    def find(self, signature: Optional[int]) -> Optional[Hashable]:
+        """Key of the first added signature within MAX_DISTANCE bits, or None."""
+        if signature is None:
+            return None
+        for band, value in self._band_values(signature):
+            for key in self._bands[band].get(value, ()):
+                if distance(self.signatures[key], signature) <= MAX_DISTANCE:
+                    return key
+        return None
+
+
+def collapse(items: list, signature: Callable, limit: int) -> list[tuple[object, list]]:
+    """Group ranked items into (best item, [near-duplicates ranked below it]), best first, up to `limit` groups."""
+    groups, index = [], SimHashIndex()
+    for item in items:
+        sig = signature(item)
+        match = index.find(sig)
+        if match is not None:
+            groups[match][1].append(item)
+            continue
+        if len(groups) >= limit:
+            continue
+        if sig is not None:
+            index.add(len(groups), sig)
+        groups.append((item, []))
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AGI Knowledge near-duplicate report")
+    parser.parse_args()
+
+    from manifest import corpus_files
+    from search import stored_text, workspace_key
+
+    signatures = {}
+    for f in corpus_files():
+        key = workspace_key(str(f))
+        signatures[key] = simhash(stored_text(key) or "")
+    groups = [g for g in collapse(sorted(signatures), signatures.get, len(signatures)) if g[1]]
+    print(f"🔍 {len(groups)} near-duplicate groups among {len(signatures)} documents "
+          f"({sum(len(dups) for _, dups in groups)} duplicates)")
+    for key, dups in groups:
+        print(f"   {key}")
+        for dup in dups:
+            print(f"     ≈ {dup} ({distance(signatures[key], signatures[dup])} bits)")
+
+
+if __name__ == "__main__":
+    main()
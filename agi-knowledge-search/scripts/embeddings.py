@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+AGI Knowledge Search - Embedding generation and cache
+
+Shared by index.py, vector_store.py and search.py so that no text is ever
+embedded twice. Cached vectors are keyed by (model, task type, dimension,
+text hash) and stored as float16. A reduced-dimension request is also served
+from a cached full-dimension vector of the same text, truncated and
+re-normalized (the model is Matryoshka-trained):
+
+    data/embeddings/vectors.f16   raw little-endian float16 vectors, appended
+    data/embeddings/index.bin     fixed-size records: key (16B), offset, dim
+
+Both files are append-only and writers serialize on a lock file, so several
+processes can share the cache; readers pick up new records on a miss.
+
+Search queries go through `QueryCache`: an in-process LRU over a separate
+on-disk cache (data/embeddings/queries/) keyed by the normalized query text
+and model, so a repeated query skips the embedding round-trip.
+
+Bulk ingestion (`embed_many`) uses the batchEmbedContents endpoint over
+keep-alive connections with a bounded number of requests in flight. A token
+bucket shared by all processes through a lock file paces requests, and 429
+responses pause every process for the server's retry delay.
+
+Usage:
+    python embeddings.py stats
+
+Environment:
+    GEMINI_EMBED_RPM    texts embedded per minute across all processes (default 1500)
+"""
+
+import argparse
+import fcntl
+import hashlib
+import http.client
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Union
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+
+WORKSPACE = Path("/config/.openclaw/workspace")
+CACHE_DIR = WORKSPACE / "data/embeddings"
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+EMBEDDING_DIM = 3072
+EMBEDDING_DIMS = (768, 1536, 3072)  # output dimensionalities recommended for the model
+MAX_CHARS = 8000
+
+API_HOST = "generativelanguage.googleapis.com"
+BATCH_SIZE = 100          # batchEmbedContents accepts at most 100 requests
+WORKERS = 4               # batch requests in flight
+EMBED_RPM = int(os.environ.get("GEMINI_EMBED_RPM", "1500"))
+MAX_ATTEMPTS = 5
+EMBED_TIMEOUT = 30.0      # seconds per single embedContent call
+BATCH_TIMEOUT = 60.0      # seconds per batchEmbedContents call when indexing
+
+QUERY_CACHE_DIR = CACHE_DIR / "queries"
+QUERY_LRU_SIZE = 1024
+
+RECORD = struct.Struct("<16sQI")  # key, byte offset into vectors.f16, dimension
+
+
+def get_embedding(text: str, api_key: str, task_type: Optional[str] = None,
+                  dim: Optional[int] = None, timeout: float = EMBED_TIMEOUT) -> Union[list[float], str, None]:
+    """Embed text with the Gemini API. Returns "rate_limited" on HTTP 429."""
+    if len(text) > MAX_CHARS:
+        text = text[:MAX_CHARS]
+    url = f"https://generativelanguage.googleapis.com/v1beta/{EMBEDDING_MODEL}:embedContent?key={api_key}"
+    payload = {"model": EMBEDDING_MODEL, "content": {"parts": [{"text": text}]}}
+    if task_type:
+        payload["taskType"] = task_type
+    if dim:
+        payload["outputDimensionality"] = dim
+    try:
+        req = Request(url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+        with urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read().decode()).get("embedding", {}).get("values", [])
+    except HTTPError as e:
+        if e.code == 429:
+            return "rate_limited"
+        print(f"⚠️ Embedding API error: {e.code} - {e.read().decode()[:200]}", file=sys.stderr)
+        return None
+    except Exception as e:
+        print(f"⚠️ Embedding error: {e}", file=sys.stderr)
+        return None
+
+
+def cache_key(text: str, model: str = EMBEDDING_MODEL, task_type: Optional[str] = None,
+              dim: Optional[int] = None) -> bytes:
+    """16-byte content address of an embedding request."""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model}\0{task_type or ''}\0{dim or 0}\0{text_hash}".encode()).digest()[:16]
+
+
+class EmbeddingCache:
+    """Append-only float16 embedding store with an in-memory offset index."""
+
+    def __init__(self, cache_dir: Path = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.vectors_file = cache_dir / "vectors.f16"
+        self.index_file = cache_dir / "index.bin"
+        self.lock_file = cache_dir / ".lock"
+        self._offsets: dict[bytes, tuple[int, int]] = {}
+        self._index_pos = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._sync()
+
+    def _sync(self):
+        """Read index records appended since the last sync (by any process)."""
+        try:
+            with open(self.index_file, "rb") as f:
+                f.seek(self._index_pos)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        usable = len(data) - len(data) % RECORD.size  # ignore a torn trailing record
+        for key, offset, dim in RECORD.iter_unpack(data[:usable]):
+            self._offsets[key] = (offset, dim)
+        self._index_pos += usable
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._offsets
+
+    def get_by_key(self, key: bytes) -> Optional[list[float]]:
+        entry = self._offsets.get(key)
+        if entry is None:
+            with self._lock:
+                self._sync()
+            entry = self._offsets.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        offset, dim = entry
+        with open(self.vectors_file, "rb") as f:
+            f.seek(offset)
+            data = f.read(dim * 2)
+        if len(data) != dim * 2:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return list(struct.unpack(f"<{dim}e", data))
+
+    def get(self, text: str, model: str = EMBEDDING_MODEL, task_type: Optional[str] = None,
+            dim: Optional[int] = None) -> Optional[list[float]]:
+        return self.get_by_key(cache_key(text, model, task_type, dim))
+
+    def put_by_key(self, key: bytes, vector: list[float]):
+        if key in self._offsets:
+            return
+        data = struct.pack(f"<{len(vector)}e", *vector)
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_file, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    # Vector first, then the record pointing at it
+                    with open(self.vectors_file, "ab") as vf:
+                        offset = vf.seek(0, os.SEEK_END)
+                        vf.write(data)
+                    with open(self.index_file, "ab") as xf:
+                        xf.write(RECORD.pack(key, offset, len(vector)))
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+            self._sync()
+
+    def put(self, text: str, vector: list[float], model: str = EMBEDDING_MODEL,
+            task_type: Optional[str] = None, dim: Optional[int] = None):
+        self.put_by_key(cache_key(text, model, task_type, dim), vector)
+
+
+def truncate_embedding(vector: list[float], dim: int) -> list[float]:
+    """Leading `dim` components of a vector, re-normalized to unit length."""
+    head = vector[:dim]
+    norm = sum(v * v for v in head) ** 0.5 or 1.0
+    return [v / norm for v in head]
+
+
+def lookup(cache: EmbeddingCache, text: str, task_type: Optional[str] = None,
+           dim: Optional[int] = None) -> Optional[list[float]]:
+    """Cached vector for text, falling back to a truncated full-dimension vector."""
+    vector = cache.get_by_key(cache_key(text, EMBEDDING_MODEL, task_type, dim))
+    if vector is None and dim and dim < EMBEDDING_DIM:
+        full = cache.get_by_key(cache_key(text, EMBEDDING_MODEL, task_type, None))
+        if full is not None:
+            vector = truncate_embedding(full, dim)
+    return vector
+
+
+_default_cache: Optional[EmbeddingCache] = None
+
+
+def default_cache() -> EmbeddingCache:
+    """Process-wide cache instance."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache()
+    return _default_cache
+
+
+# ── Query embeddings ────────────────────────────────────
+
+def normalize_query(query: str) -> str:
+    """Cache form of a query: NFKC, case-folded, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+class QueryCache:
+    """Two-level query embedding cache: in-process LRU, then an on-disk `EmbeddingCache`.
+
+    The normalized query is what gets embedded, so every spelling that
+    normalizes alike shares one entry. Thread-safe.
+    """
+
+    def __init__(self, size: int = QUERY_LRU_SIZE, disk: Optional[EmbeddingCache] = None,
+                 timeout: float = EMBED_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.disk = disk or EmbeddingCache(QUERY_CACHE_DIR)
+        self._lru: OrderedDict[bytes, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: bytes, vector: list[float]):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.size:
+                self._lru.popitem(last=False)
+
+    def _lookup(self, key: bytes) -> Optional[list[float]]:
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+        vector = self.disk.get_by_key(key)
+        if vector is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._remember(key, vector)
+        return vector
+
+    def embed(self, query: str, api_key: str, dim: Optional[int] = None) -> Optional[list[float]]:
+        """Embedding of a search query, from cache when possible. None on failure."""
+        text = normalize_query(query)
+        key = cache_key(text, EMBEDDING_MODEL, None, dim)
+        vector = self._lookup(key)
+        if vector is not None:
+            return vector
+
+        vector = get_embedding(text, api_key, None, dim, self.timeout)
+        with self._lock:
+            self.misses += 1
+        if vector == "rate_limited":
+            print("⚠️ Query embedding rate limited", file=sys.stderr)
+            return None
+        if not vector:
+            return None
+        self.disk.put_by_key(key, vector)
+        self._remember(key, vector)
+        return vector
+
+    def embed_batch(self, queries: list[str], api_key: str,
+                    dim: Optional[int] = None) -> list[Optional[list[float]]]:
+        """Embeddings of many queries, in order. Cache misses go out in one batchEmbedContents call
+        per BATCH_SIZE distinct queries. None where embedding failed."""
+        normalized = [normalize_query(q) for q in queries]
+        keys = [cache_key(text, EMBEDDING_MODEL, None, dim) for text in normalized]
+        texts = dict(zip(keys, normalized))
+        found = {}
+        for key in texts:
+            vector = self._lookup(key)
+            if vector is not None:
+                found[key] = vector
+
+        missing = [key for key in texts if key not in found]
+        with self._lock:
+            self.misses += len(missing)
+        for start in range(0, len(missing), BATCH_SIZE):
+            batch = missing[start:start + BATCH_SIZE]
+            # One try within the upstream timeout, like `embed`; a failed query is not worth a retry wait
+            vectors = batch_embed([texts[key] for key in batch], api_key, None, dim,
+                                  timeout=self.timeout, attempts=1)
+            for key, vector in zip(batch, vectors or []):
+                if vector:
+                    self.disk.put_by_key(key, vector)
+                    self._remember(key, vector)
+                    found[key] = vector
+        return [found.get(key) for key in keys]
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self._lru),
+            "disk_entries": len(self.disk),
+        }
+
+
+_default_query_cache: Optional[QueryCache] = None
+
+
+def default_query_cache() -> QueryCache:
+    """Process-wide query cache instance."""
+    global _default_query_cache
+    if _default_query_cache is None:
+        _default_query_cache = QueryCache()
+    return _default_query_cache
+
+
+# ── Batched ingestion ────────────────────────────────────
+
+
+class RateLimiter:
+    """Token bucket whose state is shared by all processes through a lock file.
+
+    Tokens are texts; the bucket refills at `per_minute` and holds up to
+    `burst`. `penalize()` records a server retry hint so every process waits it out.
+    """
+
+    def __init__(self, per_minute: int = EMBED_RPM, burst: Optional[int] = None,
+                 state_file: Path = CACHE_DIR / "ratelimit.json"):
+        self.rate = per_minute / 60.0
+        self.burst = burst or max(BATCH_SIZE, per_minute // 6)
+        self.state_file = state_file
+        self.lock_file = state_file.with_name(".ratelimit.lock")
+
+    def _update(self, fn):
+        """Run fn(state, now) under the inter-process lock and persist the state."""
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    state = json.loads(self.state_file.read_text())
+                except (FileNotFoundError, ValueError):
+                    state = {"tokens": float(self.burst), "updated": time.time(), "blocked_until": 0.0}
+                now = time.time()
+                state["tokens"] = min(self.burst, state["tokens"] + (now - state["updated"]) * self.rate)
+                state["updated"] = now
+                result = fn(state, now)
+                self.state_file.write_text(json.dumps(state))
+                return result
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def acquire(self, n: int = 1):
+        """Block until `n` tokens are available (or the retry window passed)."""
+        n = min(n, self.burst)
+
+        def take(state, now):
+            if now < state["blocked_until"]:
+                return state["blocked_until"] - now
+            if state["tokens"] >= n:
+                state["tokens"] -= n
+                return 0.0
+            return (n - state["tokens"]) / self.rate
+
+        while True:
+            wait = self._update(take)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, 60.0))
+
+    def penalize(self, delay: float):
+        """Stop all processes from sending for `delay` seconds."""
+        def block(state, now):
+            state["blocked_until"] = max(state["blocked_until"], now + delay)
+            state["tokens"] = 0.0
+        self._update(block)
+
+
+_local = threading.local()
+
+
+def _post(path: str, payload: dict, timeout: float = BATCH_TIMEOUT) -> tuple[int, http.client.HTTPMessage, bytes]:
+    """POST JSON over this thread's keep-alive connection, reconnecting once if it went stale."""
+    body = json.dumps(payload).encode()
+    for attempt in range(2):
+        conn = getattr(_local, "conn", None)
+        if conn is None:
+            conn = _local.conn = http.client.HTTPSConnection(API_HOST, timeout=timeout)
+        elif conn.timeout != timeout:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+        try:
+            conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            return resp.status, resp.headers, resp.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            _local.conn = None
+            if attempt:
+                raise
+    raise RuntimeError("unreachable")
+
+
+def retry_delay(headers, body: bytes) -> Optional[float]:
+    """Server retry hint from a `Retry-After` header or a google.rpc.RetryInfo detail."""
+    value = headers.get("Retry-After") if headers else None
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    try:
+        for detail in json.loads(body).get("error", {}).get("details", []):
+            if "retryDelay" in detail:
+                return float(str(detail["retryDelay"]).rstrip("s"))
+    except (ValueError, AttributeError):
+        pass
+    return None
+
+
+def batch_embed(texts: list[str], api_key: str, task_type: Optional[str] = None,
+                dim: Optional[int] = None, limiter: Optional[RateLimiter] = None,
+                timeout: float = BATCH_TIMEOUT, attempts: int = MAX_ATTEMPTS) -> Optional[list[list[float]]]:
+    """Embed up to BATCH_SIZE texts in one batchEmbedContents call, retrying 429/5xx.
+
+    Each call waits at most `timeout` seconds; after `attempts` failed calls
+    returns None, else one vector per text.
+    """
+    requests = []
+    for text in texts:
+        req = {"model": EMBEDDING_MODEL, "content": {"parts": [{"text": text[:MAX_CHARS]}]}}
+        if task_type:
+            req["taskType"] = task_type
+        if dim:
+            req["outputDimensionality"] = dim
+        requests.append(req)
+    path = f"/v1beta/{EMBEDDING_MODEL}:batchEmbedContents?key={api_key}"
+
+    for attempt in range(attempts):
+        if limiter:
+            limiter.acquire(len(texts))
+        try:
+            status, headers, body = _post(path, {"requests": requests}, timeout)
+        except (http.client.HTTPException, OSError) as e:
+            print(f"⚠️ Batch embedding error: {e}", file=sys.stderr)
+            if attempt + 1 < attempts:
+                time.sleep(2 ** attempt)
+            continue
+        if status == 200:
+            embeddings = json.loads(body).get("embeddings", [])
+            if len(embeddings) == len(texts):
+                return [e.get("values", []) for e in embeddings]
+            print(f"⚠️ Batch returned {len(embeddings)}/{len(texts)} embeddings", file=sys.stderr)
+            return None
+        if status == 429 or status >= 500:
+            delay = retry_delay(headers, body) or min(5 * 2 ** attempt, 120)
+            if limiter:
+                limiter.penalize(delay)
+            if attempt + 1 == attempts:
+                print(f"⚠️ Embedding API {status}, giving up after {attempts} attempt(s)", file=sys.stderr)
+                break
+            print(f"⏳ Embedding API {status}, retrying in {delay:.0f}s "
+                  f"(attempt {attempt + 1}/{attempts})", file=sys.stderr)
+            if not limiter:
+                time.sleep(delay)
+            continue
+        print(f"⚠️ Embedding API error: {status} - {body.decode(errors='replace')[:200]}", file=sys.stderr)
+        return None
+    return None
+
+
+def embed_many(texts: list[str], api_key: str, task_type: Optional[str] = None,
+               dim: Optional[int] = None, batch_size: int = BATCH_SIZE, workers: int = WORKERS,
+               cache: Optional[EmbeddingCache] = None, limiter: Optional[RateLimiter] = None,
+               progress=None) -> list[Optional[list[float]]]:
+    """Embed many texts through the cache; misses go out in concurrent batches.
+
+    Returns vectors aligned with `texts` (None where embedding failed).
+    `progress(done, total)` is called after each finished batch.
+    """
+    cache = cache or default_cache()
+    limiter = limiter or RateLimiter()
+    batch_size = max(1, min(batch_size, BATCH_SIZE))
+    texts = [t[:MAX_CHARS] for t in texts]
+    keys = [cache_key(t, EMBEDDING_MODEL, task_type, dim) for t in texts]
+
+    vectors: dict[bytes, Optional[list[float]]] = {}
+    missing: dict[bytes, str] = {}
+    for key, text in zip(keys, texts):
+        if key in vectors or key in missing:
+            continue
+        vec = lookup(cache, text, task_type, dim)
+        if vec is None:
+            missing[key] = text
+        else:
+            vectors[key] = vec
+
+    pending = list(missing.items())
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    def run(batch):
+        result = batch_embed([t for _, t in batch], api_key, task_type, dim, limiter)
+        if result:
+            for (key, _), vec in zip(batch, result):
+                cache.put_by_key(key, vec)
+        return batch, result
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch, result in pool.map(run, batches):
+            for i, (key, _) in enumerate(batch):
+                vectors[key] = result[i] if result else None
+            done += len(batch)
+            if progress:
+                progress(done, len(pending))
+
+    return [vectors.get(key) for key in keys]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AGI Knowledge embedding cache")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("stats")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        cache = default_cache()
+        size = cache.vectors_file.stat().st_size if cache.vectors_file.exists() else 0
+        print(f"📊 Embedding Cache")
+        print(f"   Entries: {len(cache)}")
+        print(f"   Vectors: {size / 1024 / 1024:.1f} MB")
+        print(f"   Path: {cache.cache_dir}")
+        print(f"   Cached queries: {len(default_query_cache().disk)}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+AGI Knowledge Search - BM25 full-text index
+
+Persistent inverted index over the knowledge base. Latin text is indexed as
+lowercased words, CJK text (kana/kanji) as overlapping character bigrams, so
+Japanese queries match without a morphological analyzer. Documents are scored
+with BM25F over a weighted title field and the body. Each document also keeps
+its SimHash (dedup.py) so near-duplicate hits collapse into one result.
+
+Usage:
+    python fulltext.py build [--rebuild]
+    python fulltext.py search "query" [--type TYPE] [--date-after DATE] [--limit N]
+"""
+
+import argparse
+import hashlib
+import heapq
+import math
+import os
+import pickle
+import re
+import sys
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Iterable, Optional
+
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from search import (
+    build_snippet, extract_metadata, extract_text, get_file_type, stored_text, INDEX_DIR, WORKSPACE
+)
+
+FULLTEXT_INDEX_FILE = INDEX_DIR / "fulltext.pkl"
+FORMAT_VERSION = 2
+DUPLICATE_OVERSAMPLE = 3  # hits fetched per result so collapsed near-duplicates still fill a page
+
+# BM25F parameters
+K1 = 1.2
+B_TITLE = 0.5
+B_BODY = 0.75
+TITLE_WEIGHT = 3.0
+
+# Latin words/numbers, or runs of CJK characters (hiragana, katakana, kanji)
+TOKEN_RE = re.compile(r"([0-9a-z]+)|([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+)")
+DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+TF_MAX = 0xFFFF
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into index terms: Latin words and CJK character bigrams."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    terms = []
+    for word, cjk in TOKEN_RE.findall(text):
+        if word:
+            terms.append(word)
+        elif len(cjk) == 1:
+            terms.append(cjk)
+        else:
+            terms.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return terms
+
+
+def document_date(metadata: dict) -> str:
+    """Normalize the frontmatter date (or a date in the title) to YYYY-MM-DD."""
+    match = DATE_RE.search(metadata.get("date", metadata.get("title", "")))
+    return match.group(1) if match else ""
+
+
+def _term_counts(terms: Iterable[str]) -> dict[str, int]:
+    counts = {}
+    for t in terms:
+        counts[t] = counts.get(t, 0) + 1
+    return counts
+
+
+class FullTextIndex:
+    """Inverted index with BM25F scoring and incremental updates.
+
+    Postings are two parallel `array`s per term: document ids and packed term
+    frequencies (title tf in the high 16 bits, body tf in the low 16 bits).
+    Replaced or deleted documents are dropped from `docs` and their postings are
+    skipped at query time until `compact()` rewrites the arrays.
+    """
+
+    def __init__(self):
+        self.docs: dict[int, dict] = {}
+        self.path_ids: dict[str, int] = {}
+        self.postings: dict[str, tuple[array, array]] = {}
+        self.next_id = 0
+        self.dead = 0
+        self.title_len_total = 0
+        self.body_len_total = 0
+
+    # ── Persistence ─────────────────────────────────────────
+
+    @classmethod
+    def load(cls, path: Path = FULLTEXT_INDEX_FILE) -> "FullTextIndex":
+        """Load the index from disk, or return an empty index."""
+        if path.exists():
+            try:
+                with open(path, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == FORMAT_VERSION:
+                    index = cls()
+                    index.__dict__.update(data["state"])
+                    return index
+            except Exception as e:
+                print(f"⚠️ Full-text index unreadable, rebuilding: {e}", file=sys.stderr)
+        return cls()
+
+    def save(self, path: Path = FULLTEXT_INDEX_FILE):
+        """Write the index atomically (temp file + rename)."""
+        if self.dead > len(self.docs) // 4:
+            self.compact()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": FORMAT_VERSION, "state": self.__dict__}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def compact(self):
+        """Drop postings of replaced/deleted documents."""
+        live = self.docs
+        for term in list(self.postings):
+            ids, tfs = self.postings[term]
+            keep = [(d, tf) for d, tf in zip(ids, tfs) if d in live]
+            if not keep:
+                del self.postings[term]
+            elif len(keep) != len(ids):
+                self.postings[term] = (array("I", (d for d, _ in keep)), array("I", (tf for _, tf in keep)))
+        self.dead = 0
+
+    # ── Updates ─────────────────────────────────────────────
+
+    def add_document(self, path_key: str, title: str, text: str, doc_type: str, date: str,
+                     content_hash: str, stat: tuple = ()):
+        """Index a document, replacing any previous version with the same path."""
+        from dedup import signature
+
+        self.remove_document(path_key)
+
+        doc_id = self.next_id
+        self.next_id += 1
+        title_counts = _term_counts(tokenize(title))
+        body_terms = tokenize(text)
+        body_counts = _term_counts(body_terms)
+
+        for term in title_counts.keys() | body_counts.keys():
+            tf = (min(title_counts.get(term, 0), TF_MAX) << 16) | min(body_counts.get(term, 0), TF_MAX)
+            plist = self.postings.get(term)
+            if plist is None:
+                plist = self.postings[term] = (array("I"), array("I"))
+            plist[0].append(doc_id)
+            plist[1].append(tf)
+
+        title_len = sum(title_counts.values())
+        body_len = sum(body_counts.values())
+        self.docs[doc_id] = {
+            "path": path_key,
+            "title": title,
+            "type": doc_type,
+            "date": date,
+            "hash": content_hash,
+            "stat": stat,
+            "title_len": title_len,
+            "body_len": body_len,
+            "simhash": signature(body_terms),
+        }
+        self.path_ids[path_key] = doc_id
+        self.title_len_total += title_len
+        self.body_len_total += body_len
+        return doc_id
+
+    def remove_document(self, path_key: str) -> bool:
+        """Remove a document by path. Its postings are reclaimed by `compact()`."""
+        doc_id = self.path_ids.pop(path_key, None)
+        if doc_id is None:
+            return False
+        doc = self.docs.pop(doc_id)
+        self.title_len_total -= doc["title_len"]
+        self.body_len_total -= doc["body_len"]
+        self.dead += 1
+        return True
+
+    def update_document(self, file_path: Path, metadata: dict, plain_text: str,
+                        stat: tuple = ()) -> bool:
+        """Index already extracted document content if it changed. Returns True if it did."""
+        path_key = str(file_path.relative_to(WORKSPACE))
+        content_hash = hashlib.md5(plain_text.encode()).hexdigest()
+        doc_id = self.path_ids.get(path_key)
+        if doc_id is not None and self.docs[doc_id]["hash"] == content_hash:
+            self.docs[doc_id]["stat"] = stat
+            return False
+        self.add_document(
+            path_key,
+            metadata.get("title", file_path.stem),
+            plain_text,
+            get_file_type(file_path),
+            document_date(metadata),
+            content_hash,
+            stat,
+        )
+        return True
+
+    def refresh(self, files: list[Path]) -> int:
+        """Bring the index in line with `files`, re-reading only changed ones.
+
+        Files are compared by (mtime, size) first and by content hash second.
+        Returns the number of documents added, updated or removed.
+        """
+        changed = 0
+        seen = set()
+        for file_path in files:
+            path_key = str(file_path.relative_to(WORKSPACE))
+            seen.add(path_key)
+            try:
+                st = file_path.stat()
+            except OSError:
+                continue
+            stat = (st.st_mtime_ns, st.st_size)
+            doc_id = self.path_ids.get(path_key)
+            if doc_id is not None and self.docs[doc_id]["stat"] == stat:
+                continue
+            try:
+                content = file_path.read_text(encoding="utf-8")
+            except Exception:
+                continue
+            if self.update_document(file_path, extract_metadata(content), extract_text(content), stat):
+                changed += 1
+
+        for path_key in [p for p in self.path_ids if p not in seen]:
+            self.remove_document(path_key)
+            changed += 1
+        return changed
+
+    # ── Query ───────────────────────────────────────────────
+
+    def search(self, query: str, limit: int = 10, doc_type: Optional[str] = None,
+               date_after: Optional[str] = None) -> list[tuple[dict, float]]:
+        """Return up to `limit` (document, BM25F score) pairs, best first.
+
+        Only the postings of the query terms are visited.
+        """
+        n_docs = len(self.docs)
+        if not n_docs:
+            return []
+        avg_title = max(self.title_len_total / n_docs, 1.0)
+        avg_body = max(self.body_len_total / n_docs, 1.0)
+
+        docs = self.docs
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if plist is None:
+                continue
+            ids, tfs = plist
+            df = min(len(ids), n_docs)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in zip(ids, tfs):
+                doc = docs.get(doc_id)
+                if doc is None:
+                    continue
+                if doc_type and doc["type"] != doc_type:
+                    continue
+                if date_after and doc["date"] and doc["date"] < date_after:
+                    continue
+                tf_title = tf >> 16
+                tf_body = tf & TF_MAX
+                weighted = 0.0
+                if tf_title:
+                    weighted += TITLE_WEIGHT * tf_title / (1 - B_TITLE + B_TITLE * doc["title_len"] / avg_title)
+                if tf_body:
+                    weighted += tf_body / (1 - B_BODY + B_BODY * doc["body_len"] / avg_body)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * weighted * (K1 + 1) / (K1 + weighted)
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(docs[doc_id], score) for doc_id, score in top]
+
+    def results(self, query: str, limit: int = 10, doc_type: Optional[str] = None,
+                date_after: Optional[str] = None, texts: Optional[dict] = None) -> list[dict]:
+        """Search and format hits as result dicts (title, source, date, path, snippet, highlights, score).
+
+        Snippets come from `texts` (path -> plain text) when given, otherwise from
+        the text store (textstore.py), reading the file only if it is not stored.
+        Near-duplicates among the hits are collapsed into the best-scoring copy.
+        """
+        from dedup import collapse
+
+        hits = self.search(query, limit * DUPLICATE_OVERSAMPLE, doc_type, date_after)
+        results = []
+        for (doc, score), dups in collapse(hits, lambda hit: hit[0].get("simhash"), limit):
+            text = texts.get(doc["path"]) if texts is not None else stored_text(doc["path"])
+            snippet, highlights = build_snippet(text or "", query)
+            results.append({
+                "title": doc["title"],
+                "source": doc["type"],
+                "date": doc["date"],
+                "path": doc["path"],
+                "snippet": snippet,
+                "highlights": highlights,
+                "score": round(score, 3),
+                "duplicates": len(dups),
+                "duplicate_paths": [d["path"] for d, _ in dups],
+            })
+        return results
+
+
+def load_index(files: list[Path], path: Path = FULLTEXT_INDEX_FILE) -> FullTextIndex:
+    """Load the persisted index, refresh it against `files` and save it if anything changed."""
+    index = FullTextIndex.load(path)
+    if index.refresh(files):
+        try:
+            index.save(path)
+        except OSError as e:
+            print(f"⚠️ Could not save full-text index: {e}", file=sys.stderr)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AGI Knowledge BM25 full-text index")
+    sub = parser.add_subparsers(dest="command")
+    b = sub.add_parser("build"); b.add_argument("--rebuild", action="store_true", help="Discard the existing index")
+    s = sub.add_parser("search"); s.add_argument("query")
+    s.add_argument("--type", choices=["paper", "report", "post"]); s.add_argument("--date-after")
+    s.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    from manifest import corpus_files
+
+    all_files = corpus_files()
+
+    if args.command == "build":
+        index = FullTextIndex() if args.rebuild else FullTextIndex.load()
+        changed = index.refresh(all_files)
+        index.save()
+        print(f"✅ Full-text index: {len(index.docs)} documents, {len(index.postings)} terms ({changed} changed)")
+    elif args.command == "search":
+        index = load_index(all_files)
+        for i, r in enumerate(index.results(args.query, args.limit, args.type, args.date_after), 1):
+            print(f"### {i}. {r['title']}")
+            print(f"   Type: {r['source']} | Score: {r['score']}")
+            print(f"   Path: {r['path']}")
+            print(f"   {r['snippet']}\n")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+AGI Knowledge Search - Corpus manifest
+
+One persisted list of the knowledge base's markdown files, shared by search,
+indexing, the watcher and the API:
+
+    files   workspace-relative path -> size, mtime, content hash, type, date, title, tags
+    dirs    directory -> mtime, subdirectories, markdown file names
+
+`refresh()` walks the source trees but lists a directory again only when its
+mtime changed (a file was created, deleted or renamed in it); otherwise the
+recorded listing is reused. Excluded trees (node_modules, VitePress build
+output) are pruned without being entered. Each known file costs one stat;
+only files whose (size, mtime) changed are read and hashed. The content hash
+is the md5 of the extracted plain text, the same hash the vector store and the
+BM25 index record, so they can skip unchanged files without reading them.
+
+The title/tag autocomplete index (suggest.py) is built from the file entries
+and saved with the manifest.
+
+Usage:
+    python manifest.py [--rebuild]
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+from pathlib import Path
+from typing import Optional
+
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from search import extract_metadata, extract_text, get_file_type, MEMORY_DOCS, DATA_PAPERS, DATA_X, INDEX_DIR, WORKSPACE
+from suggest import document_tags, SuggestIndex
+
+MANIFEST_FILE = INDEX_DIR / "manifest.pkl"
+FORMAT_VERSION = 2
+SOURCE_DIRS = [MEMORY_DOCS, DATA_PAPERS, DATA_X]
+EXCLUDED_DIRS = {"node_modules"}
+EXCLUDED_SUBDIRS = {".vitepress": {"dist", "cache"}}  # parent name -> excluded children
+
+
+def is_excluded_dir(path: Path) -> bool:
+    return path.name in EXCLUDED_DIRS or path.name in EXCLUDED_SUBDIRS.get(path.parent.name, ())
+
+
+def is_source_file(path: Path) -> bool:
+    """Whether a path is a knowledge-base markdown file (not build output or dependencies)."""
+    path = Path(path)
+    return path.suffix == ".md" and not any(is_excluded_dir(parent) for parent in path.parents)
+
+
+class Manifest:
+    """Persisted file list of the corpus with incremental refresh (see module docstring)."""
+
+    def __init__(self):
+        self.files: dict[str, dict] = {}
+        self.dirs: dict[str, tuple[int, tuple, tuple]] = {}
+        self.dirty = False
+        self.version = 0  # bumped whenever file entries change; not persisted
+        self._suggest: Optional[SuggestIndex] = None
+
+    @classmethod
+    def load(cls, path: Path = MANIFEST_FILE) -> "Manifest":
+        """Load the manifest from disk, or return an empty one."""
+        manifest = cls()
+        if path.exists():
+            try:
+                with open(path, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == FORMAT_VERSION:
+                    manifest.files, manifest.dirs = data["files"], data["dirs"]
+                    manifest._suggest = SuggestIndex.from_state(data["suggest"])
+            except Exception as e:
+                print(f"⚠️ Manifest unreadable, rescanning: {e}", file=sys.stderr)
+        return manifest
+
+    def save(self, path: Path = MANIFEST_FILE):
+        """Write the manifest atomically (temp file + rename)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": FORMAT_VERSION, "files": self.files, "dirs": self.dirs,
+                         "suggest": self.suggest().state()}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def _list(self, directory: str, mtime: int) -> tuple[tuple, tuple]:
+        cached = self.dirs.get(directory)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+        subdirs, files = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not is_excluded_dir(Path(entry.path)):
+                            subdirs.append(entry.name)
+                    elif entry.name.endswith(".md") and entry.is_file():
+                        files.append(entry.name)
+        except OSError:
+            pass
+        return tuple(subdirs), tuple(files)
+
+    def _entry(self, path: Path, st: os.stat_result) -> Optional[dict]:
+        try:
+            content = path.read_text(encoding="utf-8")
+        except Exception:
+            return None
+        metadata = extract_metadata(content)
+        return {
+            "size": st.st_size,
+            "mtime": st.st_mtime_ns,
+            "hash": hashlib.md5(extract_text(content).encode()).hexdigest(),
+            "type": get_file_type(path),
+            "date": metadata.get("date", ""),
+            "title": metadata.get("title", path.stem),
+            "tags": document_tags(metadata, content),
+        }
+
+    def refresh(self, roots: list[Path] = SOURCE_DIRS) -> dict[str, list[str]]:
+        """Bring the manifest in line with the file system.
+
+        Returns the keys that were "added", "modified" (content hash changed)
+        and "removed". Files touched without a content change are updated in
+        place and not reported.
+        """
+        changes = {"added": [], "modified": [], "removed": []}
+        dirs, seen = {}, set()
+        stack = [str(root) for root in roots]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            subdirs, names = self._list(directory, mtime)
+            dirs[directory] = (mtime, subdirs, names)
+            stack.extend(os.path.join(directory, sub) for sub in subdirs)
+
+            for name in names:
+                path = Path(directory, name)
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                key = str(path.relative_to(WORKSPACE))
+                old = self.files.get(key)
+                if old and (old["size"], old["mtime"]) == (st.st_size, st.st_mtime_ns):
+                    seen.add(key)
+                    continue
+                entry = self._entry(path, st)
+                if entry is None:
+                    continue
+                seen.add(key)
+                self.files[key] = entry
+                self._suggest = None
+                self.version += 1
+                if old is None:
+                    changes["added"].append(key)
+                elif old["hash"] != entry["hash"]:
+                    changes["modified"].append(key)
+                self.dirty = True
+
+        for key in [k for k in self.files if k not in seen]:
+            del self.files[key]
+            self._suggest = None
+            self.version += 1
+            changes["removed"].append(key)
+            self.dirty = True
+        if dirs != self.dirs:
+            self.dirs = dirs
+            self.dirty = True
+        return changes
+
+    def paths(self) -> list[Path]:
+        """Absolute paths of all files, in path order."""
+        return [WORKSPACE / key for key in sorted(self.files)]
+
+    def suggest(self) -> SuggestIndex:
+        """Title/tag autocomplete index of the current files (rebuilt after they change)."""
+        if self._suggest is None:
+            self._suggest = SuggestIndex.build((key, entry["title"], entry["tags"]) for key, entry in self.files.items())
+        return self._suggest
+
+    def type_counts(self) -> dict[str, int]:
+        counts = {}
+        for entry in self.files.values():
+            counts[entry["type"]] = counts.get(entry["type"], 0) + 1
+        return counts
+
+
+def load_manifest(path: Path = MANIFEST_FILE) -> Manifest:
+    """Load the persisted manifest, refresh it and save it if anything changed."""
+    manifest = Manifest.load(path)
+    manifest.refresh()
+    if manifest.dirty:
+        try:
+            manifest.save(path)
+        except OSError as e:
+            print(f"⚠️ Could not save manifest: {e}", file=sys.stderr)
+        manifest.dirty = False
+    return manifest
+
+
+def corpus_files() -> list[Path]:
+    """All markdown files of the knowledge base."""
+    return load_manifest().paths()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AGI Knowledge corpus manifest")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the saved manifest and rescan")
+    args = parser.parse_args()
+
+    manifest = Manifest() if args.rebuild else Manifest.load()
+    changes = manifest.refresh()
+    manifest.save()
+    print(f"✅ Manifest: {len(manifest.files)} files in {len(manifest.dirs)} directories "
+          f"({len(changes['added'])} added, {len(changes['modified'])} modified, {len(changes['removed'])} removed)")
+    print(f"   By type: {manifest.type_counts()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+AGI Knowledge Search - Vector store metadata
+
+Document metadata of a vector store generation, in SQLite instead of one
+pretty-printed JSON file:
+
+    settings(key, value)        store settings and totals, values JSON-encoded
+    documents(id, path, title, type, date, date_ord, hash, chunks, n_chunks, simhash, duplicate_of)
+
+`documents.id` is the stable document id; a FAISS vector id is
+`id << chunk_bits | chunk`, so resolving a search hit is a primary-key lookup,
+and filters on type/date are index scans that never touch the vectors.
+`date_ord` is the document date (frontmatter date, else a date in the title)
+parsed once at write time to an integer YYYYMMDD, 0 if undated.
+
+A near-duplicate (see dedup.py) has no vectors of its own: `n_chunks` is 0
+and `duplicate_of` is the id of the document whose vectors stand for it.
+`simhash` is stored as a signed 64-bit integer. Databases written before
+these columns existed read as having no duplicates.
+
+Vectors are partitioned into shards by document type, or by type and month
+(`document_shard`). A shard is not stored as a column; `shard_clause` selects
+its documents from `type` and `date_ord`.
+
+Generations are immutable once published (see vector_store.py), so readers
+open the database read-only with `immutable=1` and take no locks.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+METADATA_DB = "metadata.sqlite"
+DATE_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+
+SCHEMA = """
+CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    type TEXT NOT NULL,
+    date TEXT NOT NULL,
+    date_ord INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    chunks TEXT NOT NULL,
+    n_chunks INTEGER NOT NULL,
+    simhash INTEGER,
+    duplicate_of INTEGER
+);
+CREATE INDEX documents_type_date ON documents (type, date_ord);
+CREATE INDEX documents_date ON documents (date_ord);
+CREATE INDEX documents_duplicate_of ON documents (duplicate_of);
+"""
+
+DOCUMENT_COLUMNS = "id, path, title, type, date, hash, chunks, simhash, duplicate_of"
+LEGACY_COLUMNS = "id, path, title, type, date, hash, chunks, NULL, NULL"
+
+
+def date_ordinal(value: str) -> int:
+    """First YYYY-MM-DD in `value` as the integer YYYYMMDD, or 0."""
+    match = DATE_RE.search(value or "")
+    return int("".join(match.groups())) if match else 0
+
+
+def document_shard(info: dict, shard_by: str = "type") -> str:
+    """Shard of a document: its type ("post"), or with `shard_by="month"` its type
+    and month ("post-2026-03", "post-undated")."""
+    doc_type = info.get("type", "")
+    if shard_by != "month":
+        return doc_type
+    ordinal = date_ordinal(info.get("date") or info.get("title", ""))
+    return f"{doc_type}-{ordinal // 10000}-{ordinal // 100 % 100:02d}" if ordinal else f"{doc_type}-undated"
+
+
+def in_shard(info: dict, shard: str) -> bool:
+    return document_shard(info, "month" if "-" in shard else "type") == shard
+
+
+def shard_clause(shard: str) -> tuple[str, list]:
+    """SQL condition selecting the documents of a shard."""
+    doc_type, _, month = shard.partition("-")
+    if not month:
+        return "type = ?", [doc_type]
+    if month == "undated":
+        return "type = ? AND date_ord = 0", [doc_type]
+    start = int(month.replace("-", "")) * 100
+    return "type = ? AND date_ord BETWEEN ? AND ?", [doc_type, start, start + 99]
+
+
+def filter_clause(doc_type: Optional[str] = None, date_after: Optional[str] = None,
+                  shard: Optional[str] = None) -> tuple[str, list]:
+    """SQL condition for a type/date filter, optionally within one shard; undated documents pass date filters."""
+    clauses, params = ["1"], []
+    if shard:
+        clause, shard_params = shard_clause(shard)
+        clauses.append(clause)
+        params.extend(shard_params)
+    if doc_type:
+        clauses.append("type = ?")
+        params.append(doc_type)
+    if date_ordinal(date_after):
+        clauses.append("(date_ord = 0 OR date_ord >= ?)")
+        params.append(date_ordinal(date_after))
+    return " AND ".join(clauses), params
+
+
+def vector_count(info: dict) -> int:
+    """Number of vectors a document has in the index (0 for a near-duplicate)."""
+    return 0 if info.get("duplicate_of") is not None else len(info.get("chunks") or [None])
+
+
+def type_counts(files: dict) -> dict[str, int]:
+    """Number of documents per type, near-duplicates included."""
+    counts = {}
+    for info in files.values():
+        counts[info.get("type", "other")] = counts.get(info.get("type", "other"), 0) + 1
+    return counts
+
+
+def _signed(value: Optional[int]) -> Optional[int]:
+    return value - (1 << 64) if value is not None and value >= 1 << 63 else value
+
+
+def _document(row: tuple) -> tuple[str, dict]:
+    doc_id, path, title, doc_type, date, content_hash, chunks, simhash, duplicate_of = row
+    info = {
+        "id": doc_id,
+        "title": title,
+        "type": doc_type,
+        "date": date,
+        "hash": content_hash,
+        "chunks": json.loads(chunks),
+    }
+    if simhash is not None:
+        info["simhash"] = simhash & ((1 << 64) - 1)
+    if duplicate_of is not None:
+        info["duplicate_of"] = duplicate_of
+    return path, info
+
+
+def write_metadata(path: Path, meta: dict):
+    """Write store metadata (`files` plus settings) to a new database at `path`."""
+    path.unlink(missing_ok=True)
+    db = sqlite3.connect(path)
+    try:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.executescript(SCHEMA)
+        with db:
+            db.executemany(
+                "INSERT INTO settings VALUES (?, ?)",
+                ((k, json.dumps(v, ensure_ascii=False)) for k, v in meta.items() if k != "files"),
+            )
+            db.executemany(
+                f"INSERT INTO documents ({DOCUMENT_COLUMNS}, date_ord, n_chunks) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (info["id"], key, info.get("title", ""), info.get("type", ""),
+                     info.get("date", ""), info.get("hash", ""), json.dumps(info.get("chunks", [])),
+                     _signed(info.get("simhash")), info.get("duplicate_of"),
+                     date_ordinal(info.get("date") or info.get("title", "")), vector_count(info))
+                    for key, info in meta.get("files", {}).items()
+                ),
+            )
+    finally:
+        db.close()
+
+
+def read_metadata(path: Path) -> dict:
+    """Read a whole database back into the dict layout `write_metadata` takes."""
+    store = MetadataStore(path)
+    try:
+        meta = dict(store.settings)
+        meta["files"] = dict(store.documents())
+        return meta
+    finally:
+        store.close()
+
+
+class MetadataStore:
+    """Read-only, thread-safe view of a published metadata database."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._db = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro&immutable=1",
+                                   uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.settings = {k: json.loads(v) for k, v in self._query("SELECT key, value FROM settings")}
+        columns = {row[1] for row in self._query("PRAGMA table_info(documents)")}
+        self.has_duplicates = "duplicate_of" in columns
+        self._columns = DOCUMENT_COLUMNS if self.has_duplicates else LEGACY_COLUMNS
+
+    def _query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self) -> int:
+        return self._query("SELECT COUNT(*) FROM documents")[0][0]
+
+    def document(self, doc_id: int) -> Optional[tuple[str, dict]]:
+        """(path, metadata) of a document id, or None."""
+        rows = self._query(f"SELECT {self._columns} FROM documents WHERE id = ?", (doc_id,))
+        return _document(rows[0]) if rows else None
+
+    def find(self, path: str) -> Optional[tuple[str, dict]]:
+        """(path, metadata) of a workspace-relative path, or None."""
+        rows = self._query(f"SELECT {self._columns} FROM documents WHERE path = ?", (path,))
+        return _document(rows[0]) if rows else None
+
+    def documents(self) -> list[tuple[str, dict]]:
+        """All (path, metadata) pairs in id order."""
+        return [_document(row) for row in self._query(f"SELECT {self._columns} FROM documents ORDER BY id")]
+
+    def duplicates(self, doc_id: int) -> list[str]:
+        """Paths of the near-duplicates collapsed into a document."""
+        if not self.has_duplicates:
+            return []
+        return [row[0] for row in self._query(
+            "SELECT path FROM documents WHERE duplicate_of = ? ORDER BY path", (doc_id,))]
+
+    def filter(self, doc_type: Optional[str] = None, date_after: Optional[str] = None,
+               shard: Optional[str] = None) -> list[tuple[int, int]]:
+        """(document id, chunk count) of the documents passing a type/date filter, optionally within one shard."""
+        where, params = filter_clause(doc_type, date_after, shard)
+        return self._query(f"SELECT id, n_chunks FROM documents WHERE {where}", tuple(params))
+
+    def type_counts(self) -> dict[str, int]:
+        return dict(self._query("SELECT type, COUNT(*) FROM documents GROUP BY type"))
@@ -3,25 +3,52 @@
 AGI Knowledge Search - Full-text and semantic search across knowledge base.
 
 Usage:
-    python search.py "query" [--type TYPE] [--date-after DATE] [--limit N] [--semantic]
+    python search.py "query" [--type TYPE] [--date-after DATE] [--limit N] [--semantic | --hybrid]
+
+`--hybrid` runs BM25 and semantic retrieval concurrently and fuses the two
+rankings with reciprocal rank fusion.
 """
 
 import argparse
-import hashlib
 import json
+import math
 import os
 import re
-from datetime import datetime
+import heapq
+import threading
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 from typing import Optional
-from urllib.request import urlopen, Request
-from urllib.error import HTTPError, URLError
+
+from embeddings import default_query_cache, embed_many
+from metastore import MetadataStore, METADATA_DB, date_ordinal, document_shard, in_shard, vector_count
 
 # Knowledge base paths
-MEMORY_DOCS = Path("/config/.openclaw/workspace/memory/docs")
-DATA_PAPERS = Path("/config/.openclaw/workspace/data/papers")
-DATA_X = Path("/config/.openclaw/workspace/data/x")
-CACHE_DIR = Path("/config/.openclaw/workspace/data/embeddings-cache")
+WORKSPACE = Path("/config/.openclaw/workspace")
+MEMORY_DOCS = WORKSPACE / "memory/docs"
+DATA_PAPERS = WORKSPACE / "data/papers"
+DATA_X = WORKSPACE / "data/x"
+INDEX_DIR = WORKSPACE / "data/index"
+INDEX_FILE = "knowledge.faiss"  # single-index generations written before shards
+SHARDS_DIR = "shards"            # <generation>/shards/<shard>.faiss
+METADATA_FILE = "metadata.json"  # stores written before metadata.sqlite
+SHARD_WORKERS = 4                # shards searched concurrently per query
+CHUNK_OVERSAMPLE = 8  # chunk hits fetched per requested document
+DEFAULT_NPROBE = 16     # IVF cells visited per query
+DEFAULT_EF_SEARCH = 64  # HNSW candidate list size
+RRF_K = 60             # reciprocal rank fusion: score = sum of 1 / (RRF_K + rank)
+HYBRID_DEPTH = 3       # each signal retrieves limit * HYBRID_DEPTH candidates for fusion
+FILTER_EXACT_MAX = 2048  # filtered ANN queries over at most this many vectors are scored exactly
+
+# extract_text passes
+CODE_BLOCK_RE = re.compile(r"```[\s\S]*?```")
+INLINE_CODE_RE = re.compile(r"`[^`]+`")
+LINK_RE = re.compile(r"\[([^\]]+)\]\([^)]+\)")
+HEADING_MARK_RE = re.compile(r"^#+\s*", re.MULTILINE)
+EMPHASIS_RE = re.compile(r"[*_]{1,2}([^*_]+)[*_]{1,2}")
 
 
 def get_gemini_api_key() -> Optional[str]:
@@ -39,108 +66,9 @@ def get_gemini_api_key() -> Optional[str]:
     return None
 
 
-def get_embedding(text: str, api_key: str) -> Optional[list[float]]:
-    """Get embedding for text using Gemini API."""
-    max_chars = 8000
-    if len(text) > max_chars:
-        text = text[:max_chars]
-
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-embedding-001:embedContent?key={api_key}"
-    payload = {
-        "model": "models/gemini-embedding-001",
-        "content": {
-            "parts": [{"text": text}]
-        }
-    }
-
-    try:
-        req = Request(
-            url,
-            data=json.dumps(payload).encode("utf-8"),
-            headers={"Content-Type": "application/json"}
-        )
-        with urlopen(req, timeout=30) as response:
-            data = json.loads(response.read().decode("utf-8"))
-            return data.get("embedding", {}).get("values", [])
-    except HTTPError as e:
-        print(f"⚠️ Embedding API error: {e.code} - {e.read().decode()[:200]}")
-        return None
-    except Exception as e:
-        print(f"⚠️ Embedding error: {e}")
-        return None
-
-
 def get_query_embedding(query: str, api_key: str) -> Optional[list[float]]:
-    """Get embedding for search query."""
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-embedding-001:embedContent?key={api_key}"
-    payload = {
-        "model": "models/gemini-embedding-001",
-        "content": {
-            "parts": [{"text": query}]
-        }
-    }
-
-    try:
-        req = Request(
-            url,
-            data=json.dumps(payload).encode("utf-8"),
-            headers={"Content-Type": "application/json"}
-        )
-        with urlopen(req, timeout=30) as response:
-            data = json.loads(response.read().decode("utf-8"))
-            return data.get("embedding", {}).get("values", [])
-    except HTTPError as e:
-        print(f"⚠️ Query embedding API error: {e.code} - {e.read().decode()[:200]}")
-        return None
-    except Exception as e:
-        print(f"⚠️ Query embedding error: {e}")
-        return None
-
-
-def cosine_similarity(a: list[float], b: list[float]) -> float:
-    """Calculate cosine similarity between two vectors."""
-    if not a or not b or len(a) != len(b):
-        return 0.0
-
-    dot_product = sum(x * y for x, y in zip(a, b))
-    norm_a = sum(x * x for x in a) ** 0.5
-    norm_b = sum(x * x for x in b) ** 0.5
-
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-
-    return dot_product / (norm_a * norm_b)
-
-
-def get_cached_embedding(file_path: Path, content_hash: str) -> Optional[list[float]]:
-    """Get cached embedding if available."""
-    cache_file = CACHE_DIR / f"{file_path.stem}_{content_hash[:8]}.json"
-    if cache_file.exists():
-        try:
-            data = json.loads(cache_file.read_text())
-            return data.get("embedding")
-        except Exception:
-            pass
-    return None
-
-
-def save_cached_embedding(file_path: Path, content_hash: str, embedding: list[float]):
-    """Save embedding to cache."""
-    CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    cache_file = CACHE_DIR / f"{file_path.stem}_{content_hash[:8]}.json"
-    cache_file.write_text(json.dumps({"embedding": embedding, "hash": content_hash}))
-
-
-def find_markdown_files(base_path: Path) -> list[Path]:
-    """Find all markdown files in a directory, excluding node_modules."""
-    if not base_path.exists():
-        return []
-    files = []
-    for f in base_path.rglob("*.md"):
-        if "node_modules" in str(f) or ".vitepress/dist" in str(f) or ".vitepress/cache" in str(f):
-            continue
-        files.append(f)
-    return files
+    """Get embedding for search query (through the two-level query cache, see embeddings.py)."""
+    return default_query_cache().embed(query, api_key)
 
 
 def extract_metadata(content: str) -> dict:
@@ -164,11 +92,11 @@ def extract_text(content: str) -> str:
         if len(parts) >= 3:
             content = parts[2]
 
-    content = re.sub(r"```[\s\S]*?```", "", content)
-    content = re.sub(r"`[^`]+`", "", content)
-    content = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", content)
-    content = re.sub(r"^#+\s*", "", content, flags=re.MULTILINE)
-    content = re.sub(r"[*_]{1,2}([^*_]+)[*_]{1,2}", r"\1", content)
+    content = CODE_BLOCK_RE.sub("", content)
+    content = INLINE_CODE_RE.sub("", content)
+    content = LINK_RE.sub(r"\1", content)
+    content = HEADING_MARK_RE.sub("", content)
+    content = EMPHASIS_RE.sub(r"\1", content)
     content = " ".join(content.split())
 
     return content
@@ -186,218 +114,880 @@ def get_file_type(file_path: Path) -> str:
     return "other"
 
 
-def extract_snippet(text: str, query: str, context_chars: int = 100) -> str:
-    """Extract a snippet around the query match."""
-    query_lower = query.lower()
-    text_lower = text.lower()
+@lru_cache(maxsize=1024)
+def query_terms_pattern(query: str) -> Optional[re.Pattern]:
+    """Case-insensitive pattern matching any whitespace-separated term of a query, longest first."""
+    terms = sorted({t for t in query.split() if t}, key=len, reverse=True)
+    return re.compile("|".join(map(re.escape, terms)), re.IGNORECASE) if terms else None
+
 
-    pos = text_lower.find(query_lower)
+def build_snippet(text: str, query: str, context_chars: int = 100) -> tuple[str, list[list[int]]]:
+    """Snippet around the query and the [start, end) offsets of query terms within it.
+
+    The window is centred on the whole query if it occurs, else on the first
+    query term, else it is the start of the text.
+    """
+    pattern = query_terms_pattern(query)
+    pos, length = text.lower().find(query.lower()) if query else -1, len(query)
+    if pos == -1 and pattern is not None:
+        match = pattern.search(text)
+        if match:
+            pos, length = match.start(), match.end() - match.start()
     if pos == -1:
-        return text[:context_chars * 2] + "..." if len(text) > context_chars * 2 else text
+        start, end = 0, min(len(text), context_chars * 2)
+    else:
+        start, end = max(0, pos - context_chars), min(len(text), pos + length + context_chars)
 
-    start = max(0, pos - context_chars)
-    end = min(len(text), pos + len(query) + context_chars)
+    prefix = "..." if start > 0 else ""
+    snippet = prefix + text[start:end] + ("..." if end < len(text) else "")
+    shift = len(prefix) - start
+    highlights = [[m.start() + shift, m.end() + shift]
+                  for m in pattern.finditer(text, start, end)] if pattern is not None else []
+    return snippet, highlights
 
-    snippet = text[start:end]
-    if start > 0:
-        snippet = "..." + snippet
-    if end < len(text):
-        snippet = snippet + "..."
 
-    return snippet
+def extract_snippet(text: str, query: str, context_chars: int = 100) -> str:
+    """Extract a snippet around the query match."""
+    return build_snippet(text, query, context_chars)[0]
 
 
-def search_in_file(file_path: Path, query: str, args: argparse.Namespace) -> Optional[dict]:
-    """Search for query in a single file (full-text)."""
-    try:
-        content = file_path.read_text(encoding="utf-8")
-    except Exception:
-        return None
+_text_store = None
+
+
+def default_text_store():
+    """Process-wide read-only `textstore.TextStore`."""
+    global _text_store
+    if _text_store is None:
+        from textstore import TextStore
+        _text_store = TextStore()
+    return _text_store
 
-    metadata = extract_metadata(content)
-    plain_text = extract_text(content)
 
-    # Check date filter
-    if args.date_after:
+def stored_text(path: str, doc_id: Optional[int] = None) -> Optional[str]:
+    """Plain text of a document from the text store (by id when known), else extracted from the file."""
+    store = default_text_store()
+    text = store.get(doc_id) if doc_id is not None else store.get_path(path)
+    if text is None:
         try:
-            filter_date = datetime.strptime(args.date_after, "%Y-%m-%d")
-            date_str = metadata.get("date", metadata.get("title", ""))
-            if date_str:
-                match = re.search(r"(\d{4}-\d{2}-\d{2})", date_str)
-                if match:
-                    file_date = datetime.strptime(match.group(1), "%Y-%m-%d")
-                    if file_date < filter_date:
-                        return None
-        except ValueError:
-            pass
+            text = extract_text((WORKSPACE / path).read_text(encoding="utf-8"))
+        except Exception:
+            return None
+    return text
+
+
+def fulltext_search(query: str, all_files: list[Path], args: argparse.Namespace,
+                    index=None, texts: Optional[dict] = None) -> list[dict]:
+    """Full-text search using the BM25 inverted index (see fulltext.py).
+
+    Without a resident `index`, the persisted one is loaded and incrementally
+    refreshed against `all_files` first.
+    """
+    from fulltext import load_index
+
+    if index is None:
+        index = load_index(all_files)
+    return index.results(query, args.limit or 10, args.type, args.date_after, texts)
+
+
+class VectorMap:
+    """Resolve FAISS vector ids to (path, metadata, chunk number).
+
+    Chunked stores encode the chunk in the low `chunk_bits` bits of the vector
+    id (see chunker.py); older stores have one vector per document. Documents
+    come from a `files` dict or, looked up by id on first use, from a
+    `MetadataStore`.
+    """
+
+    def __init__(self, files: dict, chunk_bits: int = 0, db: Optional[MetadataStore] = None):
+        self.chunk_bits = chunk_bits
+        self.db = db
+        self.docs = {}
+        for pos, (path, meta) in enumerate(files.items()):
+            if isinstance(meta, dict):
+                self.docs[meta.get("id", meta.get("index", pos))] = (path, meta)
+
+    def __len__(self) -> int:
+        return len(self.db) if self.db is not None else len(self.docs)
+
+    def document(self, doc_id: int) -> Optional[tuple[str, dict]]:
+        doc = self.docs.get(doc_id)
+        if doc is None and self.db is not None:
+            doc = self.db.document(doc_id)
+            if doc is not None:
+                self.docs[doc_id] = doc
+        return doc
+
+    def find(self, path: str) -> Optional[dict]:
+        """Metadata (with its `id`) of a workspace-relative path, or None."""
+        if self.db is not None:
+            doc = self.db.find(path)
+            return doc[1] if doc else None
+        return next((meta for p, meta in self.docs.values() if p == path), None)
+
+    def chunk_ids(self, meta: dict):
+        """Vector ids (int64 array) of every chunk of a document."""
+        import numpy as np
 
-    # Check type filter
-    if args.type:
-        file_type = get_file_type(file_path)
-        if file_type != args.type:
+        return (meta["id"] << self.chunk_bits) + np.arange(vector_count(meta), dtype=np.int64)
+
+    def canonical(self, path: str) -> str:
+        """Path of the document whose vectors stand for `path` (itself unless it is a near-duplicate)."""
+        meta = self.find(path)
+        if meta is None or meta.get("duplicate_of") is None:
+            return path
+        doc = self.document(meta["duplicate_of"])
+        return doc[0] if doc else path
+
+    def duplicates(self, meta: dict) -> list[str]:
+        """Paths of the near-duplicates collapsed into a document."""
+        if self.db is not None:
+            return self.db.duplicates(meta["id"])
+        return sorted(p for p, m in self.docs.values() if m.get("duplicate_of") == meta["id"])
+
+    def resolve(self, vector_id: int) -> Optional[tuple[str, dict, int]]:
+        doc = self.document(vector_id >> self.chunk_bits)
+        if doc is None:
             return None
+        return doc[0], doc[1], vector_id & ((1 << self.chunk_bits) - 1)
 
-    # Search in content (case-insensitive)
-    query_lower = query.lower()
-    if query_lower not in plain_text.lower():
-        return None
+    def vector_ids(self, doc_type: Optional[str] = None, date_after: Optional[str] = None,
+                   shard: Optional[str] = None):
+        """Vector ids (int64 array) of every chunk of the documents passing a type/date filter,
+        optionally only those in one shard."""
+        import numpy as np
 
-    score = plain_text.lower().count(query_lower)
-    snippet = extract_snippet(plain_text, query)
+        if self.db is not None:
+            rows = self.db.filter(doc_type, date_after, shard)
+        else:
+            after = date_ordinal(date_after)
+            rows = [
+                (doc_id, vector_count(meta))
+                for doc_id, (_, meta) in self.docs.items()
+                if (not doc_type or meta.get("type") == doc_type)
+                and (not shard or in_shard(meta, shard))
+                and (not after or not date_ordinal(meta.get("date") or meta.get("title", ""))
+                     or date_ordinal(meta.get("date") or meta.get("title", "")) >= after)
+            ]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        doc_ids, counts = (np.array(col, dtype=np.int64) for col in zip(*rows))
+        starts = np.repeat(doc_ids << self.chunk_bits, counts)
+        offsets = np.arange(len(starts)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return starts + offsets
+
+
+class ShardedIndex:
+    """Per-source FAISS shards (see metastore.document_shard) used as one index.
+
+    Every document's vectors live in exactly one shard and vector ids are
+    global, so the shards share one `VectorMap` and their hits merge by score.
+    `search_documents` fans a query out over the shards that can match its
+    filters on a shared thread pool and merges their top hits with a heap; a
+    type-filtered query on type shards searches one shard with no id selector.
+    """
+
+    def __init__(self, shards: dict, shard_by: str = "type", dim: int = 0, directory: Optional[Path] = None):
+        self.shards = dict(shards)
+        self.shard_by = shard_by
+        self.directory = directory  # generation the shards were read from
+        self.dirty: set[str] = set()  # shards modified since they were read (vector_store.py)
+        self._dim = dim
+
+    @property
+    def d(self) -> int:
+        return next((shard.d for shard in self.shards.values()), self._dim)
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.ntotal for shard in self.shards.values())
+
+    def names(self, doc_type: Optional[str] = None, date_after: Optional[str] = None) -> list[str]:
+        """Shards that can hold vectors of documents passing a type/date filter."""
+        after = date_ordinal(date_after) // 100
+        names = []
+        for name, shard in self.shards.items():
+            shard_type, _, month = name.partition("-")
+            if not shard.ntotal or (doc_type and shard_type != doc_type):
+                continue
+            if after and month and month != "undated" and int(month.replace("-", "")) < after:
+                continue
+            names.append(name)
+        return names
 
-    return {
-        "title": metadata.get("title", file_path.stem),
-        "source": get_file_type(file_path),
-        "date": metadata.get("date", ""),
-        "path": str(file_path.relative_to(Path("/config/.openclaw/workspace"))),
-        "snippet": snippet,
-        "score": score,
-    }
+    def shard_of(self, meta: dict):
+        """The shard holding a document's vectors, or None."""
+        return self.shards.get(document_shard(meta, self.shard_by))
 
 
-def faiss_search(query: str, args: argparse.Namespace, api_key: str) -> list[dict]:
-    """Perform semantic search using FAISS index."""
-    INDEX_DIR = Path("/config/.openclaw/workspace/data/index")
-    faiss_file = INDEX_DIR / "knowledge.faiss"
-    meta_file = INDEX_DIR / "metadata.json"
+_shard_pool = None
+_shard_pool_lock = threading.Lock()
+
+
+def shard_pool() -> ThreadPoolExecutor:
+    global _shard_pool
+    with _shard_pool_lock:
+        if _shard_pool is None:
+            _shard_pool = ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="shard")
+        return _shard_pool
+
+
+def fan_out(fn, names: list[str]) -> list:
+    """`fn(name)` for every shard name, concurrently when there are several."""
+    if len(names) <= 1:
+        return [fn(name) for name in names]
+    return list(shard_pool().map(fn, names))
+
+
+def merge_hits(rows: list[list[tuple]], limit: int) -> list[tuple]:
+    """Top `limit` of several best-first hit lists, by score (the third field)."""
+    return list(islice(heapq.merge(*rows, key=lambda hit: -hit[2]), limit))
 
-    if not faiss_file.exists() or not meta_file.exists():
-        return []
+
+def shard_file(directory: Path, name: str) -> Path:
+    return directory / SHARDS_DIR / f"{name}.faiss"
+
+
+def store_dir(index_dir: Path = INDEX_DIR) -> Path:
+    """Directory of the published index generation.
+
+    vector_store.py writes each generation to `generations/<n>/` and publishes
+    it by atomically replacing the `current` symlink. Resolving the link once
+    pins a reader to one generation. Stores written before generations existed
+    keep their files directly in `index_dir`.
+    """
+    current = index_dir / "current"
+    return current.resolve() if current.is_symlink() else index_dir
+
+
+def read_index_mmap(path: Path):
+    """Open an index read-only with its vectors memory-mapped.
+
+    Processes that map the same generation share one page-cache copy. Falls
+    back to a heap copy if the index type cannot be mapped.
+    """
+    import faiss
+
+    # In-place mapping of flat code arrays (flat, SQ, HNSW storage), then
+    # on-disk inverted lists (IVF), then a plain read
+    mmap = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    for flags in (mmap | getattr(faiss, "IO_FLAG_MMAP_IFC", 0), mmap):
+        try:
+            return faiss.read_index(str(path), flags)
+        except RuntimeError:
+            pass
+    return faiss.read_index(str(path))
+
+
+def load_faiss_store(index_dir: Path = INDEX_DIR):
+    """Load the FAISS index (a `ShardedIndex`, or one index for older stores) and its `VectorMap`.
+    Returns (None, None) if unavailable."""
+    directory = store_dir(index_dir)
+    faiss_file = directory / INDEX_FILE
+    db_file = directory / METADATA_DB
+    meta_file = directory / METADATA_FILE
+
+    if not (db_file.exists() or meta_file.exists()):
+        return None, None
 
     try:
         import faiss
-        import numpy as np
     except ImportError:
-        return []
+        return None, None
+
+    if db_file.exists():
+        db = MetadataStore(db_file)
+        settings = db.settings
+        if "shards" in settings:
+            index = ShardedIndex({name: read_index_mmap(shard_file(directory, name)) for name in settings["shards"]},
+                                 settings.get("shard_by", "type"), settings.get("dimension", 0), directory)
+        elif faiss_file.exists():
+            index = read_index_mmap(faiss_file)
+        else:
+            db.close()
+            return None, None
+        return index, VectorMap({}, settings.get("chunk_bits", 0), db)
+    if not faiss_file.exists():
+        return None, None
+    index = read_index_mmap(faiss_file)
+    metadata = json.loads(meta_file.read_text())
+    return index, VectorMap(metadata.get("files", {}), metadata.get("chunk_bits", 0))
+
+
+def search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                  selected=None):
+    """Per-query search parameters, or None for an unfiltered exact index.
+
+    `nprobe` applies to IVF indexes and `ef_search` to HNSW; unset knobs keep
+    the value stored in the index. Passing them per query keeps a shared
+    index safe to use from several threads. `selected` (vector ids) restricts
+    the search to those vectors; ANN knobs are widened by the inverse of the
+    selected fraction so a restricted search still reaches enough of them.
+    """
+    import faiss
+
+    base = faiss.downcast_index(getattr(index, "index", index))  # unwrap IndexIDMap2
+    extra, widen = {}, 1.0
+    if selected is not None:
+        extra["sel"] = faiss.IDSelectorBatch(selected)
+        widen = index.ntotal / max(len(selected), 1)
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(
+            nprobe=min(math.ceil((nprobe or base.nprobe) * widen), base.nlist), **extra)
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(
+            efSearch=min(math.ceil((ef_search or base.hnsw.efSearch) * widen), max(index.ntotal, 1)), **extra)
+    return faiss.SearchParameters(**extra) if extra else None
+
+
+_direct_map_lock = threading.Lock()
+
+
+def reconstruct(index, ids):
+    """Stored vectors (decoded) of the ids of an `IndexIDMap2`, as a float32 matrix."""
+    import faiss
+
+    base = faiss.downcast_index(index.index)
+    if isinstance(base, faiss.IndexIVF) and base.direct_map.type == faiss.DirectMap.NoMap:
+        with _direct_map_lock:
+            if base.direct_map.type == faiss.DirectMap.NoMap:
+                base.make_direct_map()
+    return index.reconstruct_batch(ids)
+
+
+def exact_search(index, q_vec, ids, k: int):
+    """Score the vectors `ids` of an ANN index exactly; same shape as `index.search`."""
+    import numpy as np
+
+    scores = reconstruct(index, ids) @ q_vec[0]
+    k = min(k, len(ids))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return scores[top][None, :], ids[top][None, :]
+
+
+def _best_documents(vector_map: VectorMap, scores, ids, limit: int, accept=None) -> dict:
+    """Aggregate one row of chunk hits to {path: (path, metadata, score, chunk)} in rank order."""
+    best = {}
+    for score, vector_id in zip(scores, ids):
+        if vector_id < 0:
+            continue
+        hit = vector_map.resolve(int(vector_id))
+        if hit is None or hit[0] in best:
+            continue
+        path, meta, chunk = hit
+        if accept and not accept(meta):
+            continue
+        best[path] = (path, meta, float(score), chunk)
+        if len(best) >= limit:
+            break
+    return best
 
-    query_embedding = get_query_embedding(query, api_key)
-    if not query_embedding:
+
+def search_documents(index, vector_map: VectorMap, q_vec, limit: int,
+                     accept=None, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                     doc_type: Optional[str] = None, date_after: Optional[str] = None,
+                     shard: Optional[str] = None) -> list[tuple[str, dict, float, int]]:
+    """kNN over chunk vectors, aggregated to documents.
+
+    Each document is scored by its best chunk. `doc_type` and `date_after`
+    are pushed into the search: only vectors of matching documents are
+    considered (a faiss id selector, or exact scoring when few match), so a
+    filtered query still returns a full page. The search widens until `limit`
+    documents passing `accept(meta)` are found or the candidates are exhausted.
+    Returns (path, metadata, score, best chunk) tuples, best first.
+
+    A `ShardedIndex` is searched shard by shard (see `ShardedIndex`); `shard`
+    restricts filters to the documents of the one shard `index` is.
+    """
+    import faiss
+
+    if limit < 1:
+        return []
+    if isinstance(index, ShardedIndex):
+        def search_shard(name: str):
+            # The shards of a type filter hold only that type
+            return search_documents(index.shards[name], vector_map, q_vec, limit, accept, nprobe, ef_search,
+                                    None, date_after, shard=name if date_after else None)
+
+        return merge_hits(fan_out(search_shard, index.names(doc_type, date_after)), limit)
+    if not index.ntotal:
         return []
+    selected = None
+    if doc_type or date_after:
+        selected = vector_map.vector_ids(doc_type, date_after, shard)
+        if not len(selected):
+            return []
+    params = search_params(index, nprobe, ef_search, selected)
+    # ANN searches restricted to a few vectors can miss them; score those exactly
+    exact = (selected is not None and len(selected) <= FILTER_EXACT_MAX
+             and isinstance(params, (faiss.SearchParametersIVF, faiss.SearchParametersHNSW)))
+    total = index.ntotal if selected is None else len(selected)
+    k = min(total, limit * CHUNK_OVERSAMPLE)
+    while True:
+        if exact:
+            scores, ids = exact_search(index, q_vec, selected, k)
+        else:
+            scores, ids = index.search(q_vec, k, params=params)
+        best = _best_documents(vector_map, scores[0], ids[0], limit, accept)
+        if len(best) >= limit or k >= total:
+            return list(best.values())
+        k = min(total, k * 4)
+
+
+def search_documents_batch(index, vector_map: VectorMap, q_vecs, limit: int,
+                           nprobe: Optional[int] = None,
+                           ef_search: Optional[int] = None) -> list[list[tuple[str, dict, float, int]]]:
+    """Unfiltered `search_documents` for many queries with one multi-query `index.search`.
+
+    Rows whose first pass yields fewer than `limit` documents are widened one
+    by one through `search_documents`. Shards of a `ShardedIndex` are searched
+    concurrently and merged per query.
+    """
+    if limit < 1:
+        return [[] for _ in range(len(q_vecs))]
+    if isinstance(index, ShardedIndex):
+        per_shard = fan_out(lambda name: search_documents_batch(index.shards[name], vector_map, q_vecs, limit,
+                                                                nprobe, ef_search), index.names())
+        return [merge_hits([rows[row] for rows in per_shard], limit) for row in range(len(q_vecs))]
+    if not index.ntotal:
+        return [[] for _ in range(len(q_vecs))]
+    k = min(index.ntotal, limit * CHUNK_OVERSAMPLE)
+    scores, ids = index.search(q_vecs, k, params=search_params(index, nprobe, ef_search))
+    batch = []
+    for row in range(len(q_vecs)):
+        best = _best_documents(vector_map, scores[row], ids[row], limit)
+        if len(best) < limit and k < index.ntotal:
+            batch.append(search_documents(index, vector_map, q_vecs[row:row + 1], limit,
+                                          nprobe=nprobe, ef_search=ef_search))
+        else:
+            batch.append(list(best.values()))
+    return batch
 
-    index = faiss.read_index(str(faiss_file))
-    metadata = json.loads(meta_file.read_text())
-    files_meta = metadata.get("files", {})
 
-    # Normalize query vector
-    q_vec = np.array([query_embedding], dtype=np.float32)
-    faiss.normalize_L2(q_vec)
+def document_vector(index, vector_map: VectorMap, path: str):
+    """A stored document's vector (1 x d): the normalized mean of its chunk vectors,
+    reconstructed from the index. None if the document is not in the store."""
+    import faiss
 
-    limit = args.limit or 10
-    scores, indices = index.search(q_vec, min(limit * 2, index.ntotal))
+    meta = vector_map.find(path)
+    if meta is None or not vector_count(meta):
+        return None
+    if isinstance(index, ShardedIndex):
+        index = index.shard_of(meta)
+        if index is None:
+            return None
+    vec = reconstruct(index, vector_map.chunk_ids(meta)).mean(axis=0, keepdims=True)
+    faiss.normalize_L2(vec)
+    return vec
+
+
+def similar_documents(index, vector_map: VectorMap, path: str, limit: int,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      doc_type: Optional[str] = None,
+                      date_after: Optional[str] = None) -> Optional[list[tuple[str, dict, float, int]]]:
+    """Documents nearest to a stored document, excluding itself; no embedding call.
+    A near-duplicate uses the vectors of its canonical document. Returns None if
+    `path` is not in the store."""
+    path = vector_map.canonical(path)
+    q_vec = document_vector(index, vector_map, path)
+    if q_vec is None:
+        return None
+    if limit < 1:
+        return []
+    hits = search_documents(index, vector_map, q_vec, limit + 1, nprobe=nprobe, ef_search=ef_search,
+                            doc_type=doc_type, date_after=date_after)
+    return [hit for hit in hits if hit[0] != path][:limit]
+
+
+def passage_snippet(text: str, meta: dict, chunk: int, query: str) -> tuple[str, list[list[int]]]:
+    """`build_snippet` of the best-matching chunk of a document, if its span is known."""
+    spans = meta.get("chunks")
+    if spans and chunk < len(spans):
+        start, end = spans[chunk]
+        return build_snippet(text[start:end], query)
+    return build_snippet(text, query)
+
+
+def passage_section(meta: dict, chunk: int) -> str:
+    """Heading of the section a document's chunk starts in, from the text store's section offsets ("" if unknown)."""
+    spans = meta.get("chunks")
+    if not spans or chunk >= len(spans) or meta.get("id") is None:
+        return ""
+    sections = default_text_store().sections(meta["id"])
+    at = bisect_right([offset for offset, _ in sections], spans[chunk][0])
+    return sections[at - 1][1] if at else ""
+
+
+def query_vectors(embeddings: list[list[float]], dim: int):
+    """Query embeddings as L2-normalized float32 rows truncated to the stored dimension (see vector_store.py)."""
+    import faiss
+    import numpy as np
+
+    q_vecs = np.array([e[:dim] for e in embeddings], dtype=np.float32)
+    faiss.normalize_L2(q_vecs)
+    return q_vecs
+
+
+def faiss_search(query: str, args: argparse.Namespace, api_key: str,
+                 index=None, vector_map: Optional[VectorMap] = None,
+                 texts: Optional[dict] = None, query_embedding: Optional[list[float]] = None,
+                 hits: Optional[list] = None) -> list[dict]:
+    """Perform semantic search using FAISS index.
+
+    `index`, `vector_map` and `texts` (path -> plain text) may be passed in by a
+    long-running caller that keeps them resident; otherwise they are read from disk.
+    A batch caller may also pass the `query_embedding` or the `search_documents`
+    `hits` it already has. The snippet is taken from each document's best-matching passage.
+    """
+    if index is None:
+        index, vector_map = load_faiss_store()
+        if index is None:
+            return []
 
-    results = []
-    file_list = list(files_meta.items())
+    try:
+        import faiss
+    except ImportError:
+        return []
 
-    for score, idx in zip(scores[0], indices[0]):
-        if idx < 0 or idx >= len(file_list):
-            continue
-        if score < 0.3:
-            continue
+    if hits is None:
+        query_embedding = query_embedding or get_query_embedding(query, api_key)
+        if not query_embedding:
+            return []
+        hits = search_documents(
+            index, vector_map, query_vectors([query_embedding], index.d), args.limit or 10,
+            nprobe=getattr(args, "nprobe", None), ef_search=getattr(args, "ef_search", None),
+            doc_type=args.type, date_after=args.date_after,
+        )
+    return hit_results(hits, query, texts, vector_map=vector_map)
 
-        path, meta = file_list[idx]
-        if not isinstance(meta, dict):
-            continue
 
-        # Apply filters
-        if args.type and meta.get("type") != args.type:
+def hit_results(hits: list[tuple[str, dict, float, int]], query: str, texts: Optional[dict] = None,
+                min_score: float = 0.3, vector_map: Optional[VectorMap] = None) -> list[dict]:
+    """Format `search_documents` hits as result dicts, with snippets from `texts` or the text store.
+
+    With a `vector_map`, each result lists the near-duplicates collapsed into it.
+    """
+    results = []
+    for path, meta, score, chunk in hits:
+        if score < min_score:
             continue
 
+        # Snippet from the best-matching passage
+        snippet, highlights = "", []
+        content = texts.get(path) if texts is not None else stored_text(path, meta.get("id"))
+        if content is not None:
+            snippet, highlights = passage_snippet(content, meta, chunk, query)
+        section = passage_section(meta, chunk)
+        duplicates = vector_map.duplicates(meta) if vector_map is not None else []
+
         results.append({
             "title": meta.get("title", Path(path).stem),
             "source": meta.get("type", "other"),
             "date": meta.get("date", ""),
             "path": path,
-            "snippet": "",
-            "score": round(float(score) * 100, 1),
+            "snippet": snippet,
+            "highlights": highlights,
+            "section": section,
+            "score": round(score * 100, 1),
             "semantic": True,
+            "duplicates": len(duplicates),
+            "duplicate_paths": duplicates,
         })
 
-        if len(results) >= limit:
-            break
+    return results
 
-    # Enrich snippets
-    workspace = Path("/config/.openclaw/workspace")
-    for r in results:
-        fpath = workspace / r["path"]
-        if fpath.exists():
-            try:
-                content = extract_text(fpath.read_text(encoding="utf-8"))
-                r["snippet"] = extract_snippet(content, query)
-            except Exception:
-                pass
 
-    return results
+def read_documents(files: list[Path]) -> tuple[list[tuple[Path, dict, str]], list[str]]:
+    """(path, frontmatter, plain text) of every readable file, and its markdown."""
+    documents, contents = [], []
+    for file_path in files:
+        try:
+            content = file_path.read_text(encoding="utf-8")
+        except Exception:
+            continue
+        documents.append((file_path, extract_metadata(content), extract_text(content)))
+        contents.append(content)
+    return documents, contents
+
+
+class EmbeddingMatrix:
+    """Chunk embeddings as one contiguous, L2-normalized float32 matrix.
 
+    Semantic search without a FAISS index: documents are chunked like the
+    vector store does (chunker.py), so rows come from the shared embedding
+    cache, and a query is scored against every chunk with one matrix-vector
+    product. Each document scores as its best chunk, like `search_documents`,
+    and the top documents are selected with `argpartition`. Type and date are
+    kept as parallel per-document arrays so filters are vectorized too.
+    """
 
-def semantic_search(query: str, all_files: list[Path], args: argparse.Namespace, api_key: str) -> list[dict]:
-    """Perform semantic search using FAISS or fallback to per-file embeddings."""
-    # Try FAISS first
-    faiss_results = faiss_search(query, args, api_key)
-    if faiss_results:
-        return faiss_results
+    def __init__(self, documents: list[tuple[Path, dict, str]], api_key: str,
+                 contents: Optional[list[str]] = None):
+        """Embed `documents`; `contents` is their markdown, which is otherwise read from the files to chunk them."""
+        import numpy as np
+        from chunker import chunk_texts  # chunker imports this module
+
+        chunked = []
+        for i, (file_path, metadata, text) in enumerate(documents):
+            if contents is not None:
+                content = contents[i]
+            else:
+                try:
+                    content = file_path.read_text(encoding="utf-8")
+                except Exception:
+                    content = text
+            _, chunks = chunk_texts(content, text, metadata.get("title", file_path.stem))
+            chunked.append(chunks or [metadata.get("title", file_path.stem)])
+        vectors = embed_many([c for chunks in chunked for c in chunks], api_key)
+
+        rows, owners, self.documents, pos = [], [], [], 0
+        for document, chunks in zip(documents, chunked):
+            found = [v for v in vectors[pos:pos + len(chunks)] if v]
+            pos += len(chunks)
+            if found:
+                rows.extend(found)
+                owners.extend([len(self.documents)] * len(found))
+                self.documents.append(document)
+
+        self.matrix = np.array(rows, dtype=np.float32) if rows else np.empty((0, 0), dtype=np.float32)
+        self.matrix /= np.maximum(np.linalg.norm(self.matrix, axis=1, keepdims=True), 1e-12)
+        self.owners = np.array(owners, dtype=np.int64)  # document position of each row
+        self.types = np.array([get_file_type(f) for f, _, _ in self.documents])
+        self.dates = np.array([date_ordinal(m.get("date") or m.get("title", ""))
+                               for _, m, _ in self.documents], dtype=np.int64)
+
+    @classmethod
+    def from_files(cls, files: list[Path], api_key: str) -> "EmbeddingMatrix":
+        """Matrix of the readable `files`, each read once."""
+        documents, contents = read_documents(files)
+        return cls(documents, api_key, contents)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def document_vector(self, pos: int):
+        """Normalized mean of a document's chunk rows (cf. `document_vector`)."""
+        import numpy as np
 
-    # Fallback: per-file embedding comparison
-    query_embedding = get_query_embedding(query, api_key)
+        vec = self.matrix[self.owners == pos].mean(axis=0)
+        return vec / max(float(np.linalg.norm(vec)), 1e-12)
+
+    def search(self, query_embedding: list[float], limit: int, doc_type: Optional[str] = None,
+               date_after: Optional[str] = None) -> list[tuple[int, float]]:
+        """Top `limit` (document position, best chunk cosine similarity) pairs, best first."""
+        import numpy as np
+
+        if not len(self.documents) or limit < 1:
+            return []
+        q = np.asarray(query_embedding[:self.matrix.shape[1]], dtype=np.float32)
+        chunk_scores = self.matrix @ (q / max(float(np.linalg.norm(q)), 1e-12))
+        scores = np.full(len(self.documents), -np.inf, dtype=np.float32)
+        np.maximum.at(scores, self.owners, chunk_scores)
+        if doc_type:
+            scores[self.types != doc_type] = -np.inf
+        after = date_ordinal(date_after)
+        if after:
+            scores[(self.dates != 0) & (self.dates < after)] = -np.inf
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > -np.inf]
+
+
+def semantic_search(query: str, all_files: list[Path], args: argparse.Namespace, api_key: str,
+                    matrix: Optional[EmbeddingMatrix] = None,
+                    query_embedding: Optional[list[float]] = None, **store) -> list[dict]:
+    """Perform semantic search using FAISS, or an `EmbeddingMatrix` if there is no index.
+
+    Extra keyword arguments (`index`, `vector_map`, `texts`, `hits`) are passed to
+    `faiss_search`. A long-running caller may pass a resident `matrix`;
+    otherwise one is built from `all_files`.
+    """
+    if store.get("index") is None:
+        store["index"], store["vector_map"] = load_faiss_store()
+    if store["index"] is not None:
+        return faiss_search(query, args, api_key, query_embedding=query_embedding, **store)
+
+    # Fallback: brute force over cached chunk embeddings
+    query_embedding = query_embedding or get_query_embedding(query, api_key)
     if not query_embedding:
         print("⚠️ Failed to get query embedding")
         return []
 
     print(f"🧠 Performing semantic search (fallback)...")
+    if matrix is None:
+        matrix = EmbeddingMatrix.from_files(all_files, api_key)
+
     results = []
+    for pos, similarity in matrix.search(query_embedding, args.limit or 10, args.type, args.date_after):
+        if similarity <= 0.3:
+            break
+        file_path, metadata, plain_text = matrix.documents[pos]
+        snippet, highlights = build_snippet(plain_text, query)
+        results.append({
+            "title": metadata.get("title", file_path.stem),
+            "source": get_file_type(file_path),
+            "date": metadata.get("date", ""),
+            "path": str(file_path.relative_to(WORKSPACE)),
+            "snippet": snippet,
+            "highlights": highlights,
+            "score": round(similarity * 100, 1),
+            "semantic": True,
+        })
+    return results
+
 
-    for file_path in all_files:
+def workspace_key(path: str) -> str:
+    """Workspace-relative form of a document path given as absolute or relative."""
+    p = Path(path)
+    if p.is_absolute():
         try:
-            content = file_path.read_text(encoding="utf-8")
-        except Exception:
+            return str(p.resolve().relative_to(WORKSPACE.resolve()))
+        except ValueError:
+            return str(p)
+    return str(Path(*p.parts))
+
+
+def similar_search(path: str, all_files: list[Path], args: argparse.Namespace, api_key: Optional[str] = None,
+                   matrix: Optional[EmbeddingMatrix] = None, texts: Optional[dict] = None,
+                   **store) -> Optional[list[dict]]:
+    """"More like this": documents similar to the stored document at `path`.
+
+    Uses the document's own vectors from the FAISS index (`index`/`vector_map`
+    keyword arguments, else loaded from disk), so no text is sent to the
+    embedding API. Without an index the mean of the document's rows of the
+    `EmbeddingMatrix` is used. Returns None if the document is not indexed.
+    """
+    key = workspace_key(path)
+    limit = args.limit or 10
+    if store.get("index") is None:
+        store["index"], store["vector_map"] = load_faiss_store()
+    index, vector_map = store["index"], store["vector_map"]
+    if index is not None:
+        hits = similar_documents(
+            index, vector_map, key, limit,
+            nprobe=getattr(args, "nprobe", None), ef_search=getattr(args, "ef_search", None),
+            doc_type=args.type, date_after=args.date_after,
+        )
+        return None if hits is None else hit_results(hits, "", texts, min_score=-1.0, vector_map=vector_map)
+
+    if matrix is None:
+        if not api_key:
+            return None
+        matrix = EmbeddingMatrix.from_files(all_files, api_key)
+    row = next((i for i, (f, _, _) in enumerate(matrix.documents)
+                if str(f.relative_to(WORKSPACE)) == key), None)
+    if row is None:
+        return None
+    results = []
+    for pos, similarity in matrix.search(matrix.document_vector(row), limit + 1, args.type, args.date_after):
+        file_path, metadata, plain_text = matrix.documents[pos]
+        if pos == row or len(results) == limit:
             continue
+        results.append({
+            "title": metadata.get("title", file_path.stem),
+            "source": get_file_type(file_path),
+            "date": metadata.get("date", ""),
+            "path": str(file_path.relative_to(WORKSPACE)),
+            "snippet": extract_snippet(plain_text, ""),
+            "highlights": [],
+            "score": round(similarity * 100, 1),
+            "semantic": True,
+        })
+    return results
+
 
-        metadata = extract_metadata(content)
-        plain_text = extract_text(content)
+def hybrid_search(query: str, all_files: list[Path], args: argparse.Namespace, api_key: Optional[str],
+                  fulltext_index=None, texts: Optional[dict] = None,
+                  matrix: Optional[EmbeddingMatrix] = None, **store) -> list[dict]:
+    """BM25 and semantic search run concurrently, fused with reciprocal rank fusion.
 
-        # Check type filter
-        if args.type:
-            file_type = get_file_type(file_path)
-            if file_type != args.type:
+    The embedding request and vector search overlap the BM25 scoring, so a
+    hybrid query costs about the slower of the two. Each result carries
+    `scores` and `ranks` per signal (None where that signal missed it); its
+    `score` is the fused RRF score. Without an API key only BM25 contributes.
+    Both signals collapse near-duplicates, possibly onto different copies; a
+    copy listed in another result's `duplicate_paths` is fused into that result.
+    """
+    limit = args.limit or 10
+    deep = argparse.Namespace(**{**vars(args), "limit": limit * HYBRID_DEPTH})
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        lexical = pool.submit(fulltext_search, query, all_files, deep, fulltext_index, texts)
+        semantic = pool.submit(semantic_search, query, all_files, deep, api_key,
+                               matrix=matrix, texts=texts, **store) if api_key else None
+        rankings = {"bm25": lexical.result(), "semantic": semantic.result() if semantic else []}
+
+    fused, aliases = {}, {}
+    for signal, results in rankings.items():
+        for rank, r in enumerate(results, 1):
+            key = aliases.get(r["path"], r["path"])
+            aliases.update((p, key) for p in r.get("duplicate_paths", ()) if p not in fused)
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {
+                    **r, "score": 0.0,
+                    "scores": dict.fromkeys(rankings), "ranks": dict.fromkeys(rankings),
+                }
+                entry.pop("semantic", None)
+            elif entry["ranks"][signal] is not None:
                 continue
+            entry["scores"][signal] = r["score"]
+            entry["ranks"][signal] = rank
+            entry["score"] += 1 / (RRF_K + rank)
 
-        # Check date filter
-        if args.date_after:
-            try:
-                filter_date = datetime.strptime(args.date_after, "%Y-%m-%d")
-                date_str = metadata.get("date", metadata.get("title", ""))
-                if date_str:
-                    match = re.search(r"(\d{4}-\d{2}-\d{2})", date_str)
-                    if match:
-                        file_date = datetime.strptime(match.group(1), "%Y-%m-%d")
-                        if file_date < filter_date:
-                            continue
-            except ValueError:
-                pass
-
-        # Get or create embedding
-        content_hash = hashlib.md5(plain_text.encode()).hexdigest()
-        embedding = get_cached_embedding(file_path, content_hash)
-
-        if not embedding:
-            embedding = get_embedding(plain_text[:2000], api_key)
-            if embedding:
-                save_cached_embedding(file_path, content_hash, embedding)
-
-        if embedding:
-            similarity = cosine_similarity(query_embedding, embedding)
-            if similarity > 0.3:
-                snippet = extract_snippet(plain_text, query)
-                results.append({
-                    "title": metadata.get("title", file_path.stem),
-                    "source": get_file_type(file_path),
-                    "date": metadata.get("date", ""),
-                    "path": str(file_path.relative_to(Path("/config/.openclaw/workspace"))),
-                    "snippet": snippet,
-                    "score": round(similarity * 100, 1),
-                    "semantic": True,
-                })
-
-    results.sort(key=lambda x: x["score"], reverse=True)
+    results = sorted(fused.values(), key=lambda r: r["score"], reverse=True)[:limit]
+    for r in results:
+        r["score"] = round(r["score"], 4)
+        r["hybrid"] = True
+    return results
+
+
+def batch_search(queries: list[tuple[str, str, argparse.Namespace]], all_files: list[Path],
+                 api_key: Optional[str], fulltext_index=None, texts: Optional[dict] = None,
+                 matrix: Optional[EmbeddingMatrix] = None, **store) -> list[list[dict]]:
+    """Run many (query, mode, args) searches; mode is "fulltext", "semantic" or "hybrid".
+
+    All query embeddings are fetched in one batch request, and unfiltered
+    semantic queries against a FAISS index share one multi-query search per
+    distinct (nprobe, ef_search). Results are returned in input order.
+    """
+    embedded = [i for i, (_, mode, _) in enumerate(queries) if mode != "fulltext"] if api_key else []
+    embeddings = dict(zip(embedded, default_query_cache().embed_batch(
+        [queries[i][0] for i in embedded], api_key))) if embedded else {}
+
+    index, vector_map = store.get("index"), store.get("vector_map")
+    if embedded and index is None:
+        index, vector_map = store["index"], store["vector_map"] = load_faiss_store()
+        if index is None and matrix is None:
+            matrix = EmbeddingMatrix.from_files(all_files, api_key)
+    hits = {}
+    if index is not None:
+        groups = {}
+        for i in embedded:
+            _, mode, args = queries[i]
+            if embeddings[i] and not args.type and not args.date_after:
+                knobs = (getattr(args, "nprobe", None), getattr(args, "ef_search", None))
+                groups.setdefault(knobs, []).append(i)
+        for (nprobe, ef_search), rows in groups.items():
+            depth = {i: (queries[i][2].limit or 10) * (HYBRID_DEPTH if queries[i][1] == "hybrid" else 1)
+                     for i in rows}
+            batch = search_documents_batch(index, vector_map, query_vectors([embeddings[i] for i in rows], index.d),
+                                           max(depth.values()), nprobe, ef_search)
+            hits.update((i, found[:depth[i]]) for i, found in zip(rows, batch))
+
+    results = []
+    for i, (query, mode, args) in enumerate(queries):
+        if mode == "fulltext":
+            found = fulltext_search(query, all_files, args, index=fulltext_index, texts=texts)
+        elif mode == "semantic":
+            found = semantic_search(query, all_files, args, api_key, matrix=matrix, texts=texts,
+                                    query_embedding=embeddings[i], hits=hits.get(i), **store) if embeddings.get(i) else []
+        else:
+            # A query whose embedding failed falls back to BM25 only
+            found = hybrid_search(query, all_files, args, api_key if embeddings.get(i) else None,
+                                  fulltext_index=fulltext_index, texts=texts, matrix=matrix,
+                                  query_embedding=embeddings.get(i), hits=hits.get(i), **store)
+        results.append(found[:args.limit or 10])
     return results
 
 
@@ -409,17 +999,23 @@ def main():
     parser.add_argument("--limit", type=int, default=10, help="Max results")
     parser.add_argument("--json", action="store_true", help="Output as JSON")
     parser.add_argument("--semantic", action="store_true", help="Use semantic search with embeddings")
+    parser.add_argument("--hybrid", action="store_true", help="Fuse full-text and semantic rankings (RRF)")
+    parser.add_argument("--nprobe", type=int, help=f"IVF cells to visit (default {DEFAULT_NPROBE})")
+    parser.add_argument("--ef-search", type=int, help=f"HNSW candidate list size (default {DEFAULT_EF_SEARCH})")
 
     args = parser.parse_args()
 
-    # Collect all markdown files
-    all_files = []
-    all_files.extend(find_markdown_files(MEMORY_DOCS))
-    all_files.extend(find_markdown_files(DATA_PAPERS))
-    all_files.extend(find_markdown_files(DATA_X))
+    from manifest import corpus_files
+
+    all_files = corpus_files()
 
     # Search
-    if args.semantic:
+    if args.hybrid:
+        api_key = get_gemini_api_key()
+        if not api_key:
+            print("⚠️ No Gemini API key found, using full-text ranking only")
+        results = hybrid_search(args.query, all_files, args, api_key)
+    elif args.semantic:
         api_key = get_gemini_api_key()
         if not api_key:
             print("⚠️ No Gemini API key found, falling back to full-text search")
@@ -429,18 +1025,9 @@ def main():
 
         if not results:
             print("ℹ️ Falling back to full-text search...")
-            for file_path in all_files:
-                result = search_in_file(file_path, args.query, args)
-                if result:
-                    results.append(result)
-            results.sort(key=lambda x: x["score"], reverse=True)
+            results = fulltext_search(args.query, all_files, args)
     else:
-        results = []
-        for file_path in all_files:
-            result = search_in_file(file_path, args.query, args)
-            if result:
-                results.append(result)
-        results.sort(key=lambda x: x["score"], reverse=True)
+        results = fulltext_search(args.query, all_files, args)
 
     # Limit results
     results = results[: args.limit]
@@ -450,14 +1037,21 @@ def main():
         output = {"query": args.query, "total": len(results), "results": results}
         print(json.dumps(output, ensure_ascii=False, indent=2))
     else:
-        mode = "🧠 Semantic" if args.semantic else "🔍"
+        mode = "🔀 Hybrid" if args.hybrid else "🧠 Semantic" if args.semantic else "🔍"
         print(f"\n{mode} Search: \"{args.query}\"")
         print(f"📊 Found: {len(results)} results\n")
         for i, r in enumerate(results, 1):
             semantic_mark = " 🧠" if r.get("semantic") else ""
             print(f"### {i}. {r['title']}{semantic_mark}")
             print(f"   Type: {r['source']} | Score: {r['score']}")
+            if r.get("hybrid"):
+                print(f"   BM25: {r['scores']['bm25']} (#{r['ranks']['bm25']}) | "
+                      f"Semantic: {r['scores']['semantic']} (#{r['ranks']['semantic']})")
             print(f"   Path: {r['path']}")
+            if r.get("section"):
+                print(f"   Section: {r['section']}")
+            if r.get("duplicates"):
+                print(f"   + {r['duplicates']} duplicates")
             print(f"   {r['snippet']}\n")
 
 
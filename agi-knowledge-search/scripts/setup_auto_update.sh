@@ -2,7 +2,8 @@
 set -euo pipefail
 
 # AGI Knowledge Index Auto-Updater
-# Rebuilds the FAISS vector store every 6 hours
+# Runs the index watcher (watcher.py): changed files are re-indexed within seconds.
+# The watcher catches up with a full incremental sync whenever it (re)starts.
 
 SERVICE_DIR=/config/s6-services/knowledge-index-updater
 
@@ -18,13 +19,10 @@ exec >>"$LOG" 2>&1
 
 echo "[$(date -u +%Y-%m-%dT%H:%M:%SZ)] knowledge-index-updater started"
 
-while true; do
-    echo "[$(date -u +%Y-%m-%dT%H:%M:%SZ)] Rebuilding vector store..."
-    cd /config/.openclaw/workspace
-    uv run skills/agi-knowledge-search/scripts/vector_store.py rebuild 2>&1 || true
-    echo "[$(date -u +%Y-%m-%dT%H:%M:%SZ)] Rebuild complete. Sleeping 6h..."
-    sleep 21600
-done
+cd /config/.openclaw/workspace
+uv run skills/agi-knowledge-search/scripts/watcher.py || true
+echo "[$(date -u +%Y-%m-%dT%H:%M:%SZ)] Watcher exited; restarting in 10s"
+sleep 10
 EOF
 
 chmod +x "$SERVICE_DIR/run"
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+AGI Knowledge Search - Title and tag autocomplete
+
+Prefix completion over document titles, frontmatter `tags: [a, b]` and the
+`#tags` in document bodies (the pattern daily_memory.extract_tags uses, not
+counting URL fragments and `&#..;` entities).
+
+`SuggestIndex` is one sorted array of normalized keys (NFKC, case-folded)
+with a parallel array of entries; a prefix is answered by one `bisect` and a
+scan of the matching run, so lookups take microseconds. Titles are keyed at
+every word start, so "atten" completes "Scaling attention notes" as well as
+"Attention is all you need"; matches at the start of a title rank first. Tags
+rank by the number of documents carrying them.
+
+The index is built from the corpus manifest (manifest.py), which records each
+file's tags, and is persisted with it, so every indexing run that refreshes
+the manifest (rebuild, watcher, API) also refreshes the suggestions.
+
+Usage:
+    python suggest.py <prefix> [--limit 10] [--kind title|tag]
+"""
+
+import argparse
+import re
+import sys
+import unicodedata
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterable, Optional
+
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from search import CODE_BLOCK_RE, INLINE_CODE_RE
+
+TAG_RE = re.compile(r"(?<![\w/&#])#(\w+)")
+DEFAULT_LIMIT = 10
+MAX_CANDIDATES = 200  # matching keys examined per lookup before ranking
+KINDS = ["title", "tag"]
+
+
+def normalize(text: str) -> str:
+    """Key form of a title, tag or prefix: NFKC, case-folded, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def document_tags(metadata: dict, content: str) -> list[str]:
+    """Tags of a document (without "#"): frontmatter `tags` first, then body #tags, in order, deduplicated."""
+    tags = [t.strip().strip("\"'").lstrip("#") for t in metadata.get("tags", "").strip("[]").split(",")]
+    if content.startswith("---"):
+        parts = content.split("---", 2)
+        if len(parts) >= 3:
+            content = parts[2]
+    body = INLINE_CODE_RE.sub("", CODE_BLOCK_RE.sub("", content))
+    tags.extend(TAG_RE.findall(body))
+    seen, unique = set(), []
+    for tag in tags:
+        if tag and normalize(tag) not in seen:
+            seen.add(normalize(tag))
+            unique.append(tag)
+    return unique
+
+
+class SuggestIndex:
+    """Sorted (key, entry) arrays over titles and tags.
+
+    An entry is (kind, text, path, count, inner): `path` is the document of a
+    title (None for tags), `count` the number of documents of a tag (1 for
+    titles) and `inner` whether the key starts mid-title.
+    """
+
+    def __init__(self, keys: Optional[list[str]] = None, entries: Optional[list[tuple]] = None):
+        self.keys = keys or []
+        self.entries = entries or []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, documents: Iterable[tuple[str, str, list[str]]]) -> "SuggestIndex":
+        """Index (path, title, tags) triples."""
+        pairs, tags = [], {}
+        for path, title, doc_tags in documents:
+            words = title.split()
+            for i in range(len(words)):
+                key = normalize(" ".join(words[i:]))
+                if key:
+                    pairs.append((key, ("title", title, path, 1, i > 0)))
+            for tag in doc_tags:
+                spelling, count = tags.get(normalize(tag), (tag, 0))
+                tags[normalize(tag)] = (spelling, count + 1)
+        pairs.extend((key, ("tag", f"#{spelling}", None, count, False))
+                     for key, (spelling, count) in tags.items())
+        pairs.sort(key=lambda pair: pair[0])
+        return cls([key for key, _ in pairs], [entry for _, entry in pairs])
+
+    def state(self) -> tuple[list[str], list[tuple]]:
+        """Plain-data form for pickling (see `from_state`)."""
+        return self.keys, self.entries
+
+    @classmethod
+    def from_state(cls, state: tuple[list[str], list[tuple]]) -> "SuggestIndex":
+        return cls(*state)
+
+    def complete(self, prefix: str, limit: int = DEFAULT_LIMIT, kind: Optional[str] = None) -> list[dict]:
+        """Titles and tags starting with `prefix`, best first. A leading "#" restricts to tags."""
+        if prefix.lstrip().startswith("#"):
+            kind = "tag"
+        key = normalize(prefix.lstrip().lstrip("#"))
+        if not key or limit < 1:
+            return []
+        found, seen = [], set()
+        i = bisect_left(self.keys, key)
+        while i < len(self.keys) and len(found) < MAX_CANDIDATES and self.keys[i].startswith(key):
+            entry = self.entries[i]
+            i += 1
+            if (kind and entry[0] != kind) or entry[:3] in seen:
+                continue
+            seen.add(entry[:3])
+            found.append(entry)
+        found.sort(key=lambda e: (e[4], -e[3], len(e[1]), e[1]))
+        return [
+            {"text": text, "kind": entry_kind, **({"path": path} if path else {"count": count})}
+            for entry_kind, text, path, count, _ in found[:limit]
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AGI Knowledge title/tag autocomplete")
+    parser.add_argument("prefix")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    parser.add_argument("--kind", choices=KINDS)
+    args = parser.parse_args()
+
+    from manifest import load_manifest
+
+    for s in load_manifest().suggest().complete(args.prefix, args.limit, args.kind):
+        if s["kind"] == "tag":
+            print(f"  🏷️ {s['text']} ({s['count']} documents)")
+        else:
+            print(f"  📄 {s['text']}  {s['path']}")
+
+
+if __name__ == "__main__":
+    main()
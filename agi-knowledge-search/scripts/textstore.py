@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+AGI Knowledge Search - Plain-text store
+
+The extracted plain text of every indexed document, written at index time by
+vector_store.py so search never re-opens or re-parses markdown to build a
+snippet:
+
+    texts(id, path, hash, codec, body, sections)
+
+`id` is the document id of the vector store (see metastore.py), `body` the
+compressed plain text (zstd when the `zstandard` package is installed, zlib
+otherwise; `codec` records which) and `sections` the JSON list of
+[offset, heading] pairs of the document's headings in the plain text, which
+label semantic hits with the section of their best passage
+(`search.passage_section`).
+
+Unlike the metadata, the text store is not per generation: writers update it
+in place (under vector_store.writer_lock) and readers may see text newer than
+their index generation, which only makes snippets fresher.
+
+Usage:
+    python textstore.py stats
+    python textstore.py show <path>
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterable, Optional
+
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from search import extract_text, INDEX_DIR
+
+TEXT_DB = INDEX_DIR / "texts.sqlite"
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS texts (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    hash TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    body BLOB NOT NULL,
+    sections TEXT NOT NULL
+);
+"""
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def compress(text: str) -> tuple[str, bytes]:
+    """(codec, blob) of a text."""
+    data = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(codec: str, blob: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("text store was written with zstd; install zstandard")
+        return zstandard.ZstdDecompressor().decompress(blob).decode("utf-8")
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def section_offsets(content: str, plain_text: str) -> list[tuple[int, str]]:
+    """(offset in the plain text, heading text) of each markdown heading."""
+    from chunker import split_blocks
+
+    sections, pos = [], 0
+    for is_heading, raw in split_blocks(content):
+        text = extract_text(raw)
+        if not text:
+            continue
+        at = plain_text.find(text, pos)
+        if at < 0:
+            continue
+        if is_heading:
+            sections.append((at, text))
+        pos = at + len(text)
+    return sections
+
+
+class TextStore:
+    """Compressed plain text by document id (or path). Thread-safe; missing database reads as empty."""
+
+    def __init__(self, path: Path = TEXT_DB, readonly: bool = True):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db = None
+        if not readonly:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode = WAL")
+            self._db.executescript(SCHEMA)
+
+    def _query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            if self._db is None:
+                # Read-only: connect once the database exists
+                if not self.path.exists():
+                    return []
+                self._db = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True,
+                                           check_same_thread=False)
+            return self._db.execute(sql, params).fetchall()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+    def __len__(self) -> int:
+        rows = self._query("SELECT COUNT(*) FROM texts")
+        return rows[0][0] if rows else 0
+
+    def ids(self) -> set[int]:
+        return {row[0] for row in self._query("SELECT id FROM texts")}
+
+    def hashes(self) -> dict[str, str]:
+        """Content hash (md5 of the plain text, as in the manifest) of every stored path."""
+        return dict(self._query("SELECT path, hash FROM texts"))
+
+    def get(self, doc_id: int) -> Optional[str]:
+        """Plain text of a document id, or None."""
+        rows = self._query("SELECT codec, body FROM texts WHERE id = ?", (doc_id,))
+        return decompress(*rows[0]) if rows else None
+
+    def get_path(self, path: str) -> Optional[str]:
+        """Plain text of a workspace-relative path, or None."""
+        rows = self._query("SELECT codec, body FROM texts WHERE path = ?", (path,))
+        return decompress(*rows[0]) if rows else None
+
+    def sections(self, doc_id: int) -> list[tuple[int, str]]:
+        rows = self._query("SELECT sections FROM texts WHERE id = ?", (doc_id,))
+        return [tuple(s) for s in json.loads(rows[0][0])] if rows else []
+
+    def put_many(self, docs: Iterable[tuple[int, str, str, str, list]]):
+        """Store (id, path, hash, plain text, sections) tuples, replacing rows with the same id or path."""
+        rows = []
+        for doc_id, path, content_hash, text, sections in docs:
+            codec, body = compress(text)
+            rows.append((doc_id, path, content_hash, codec, body, json.dumps(sections, ensure_ascii=False)))
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM texts WHERE id = ? OR path = ?", ((r[0], r[1]) for r in rows))
+            self._db.executemany("INSERT INTO texts VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def delete(self, doc_ids: Iterable[int]):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM texts WHERE id = ?", ((i,) for i in doc_ids))
+
+    def retain(self, doc_ids: Iterable[int]):
+        """Drop every row whose id is not in `doc_ids`."""
+        stale = self.ids() - set(doc_ids)
+        if stale:
+            self.delete(stale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AGI Knowledge plain-text store")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("stats")
+    sh = sub.add_parser("show"); sh.add_argument("path")
+    args = parser.parse_args()
+
+    store = TextStore()
+    if args.command == "stats":
+        rows = store._query("SELECT codec, COUNT(*), SUM(LENGTH(body)) FROM texts GROUP BY codec")
+        print(f"📊 Text store: {len(store)} documents")
+        for codec, count, size in rows:
+            print(f"   {codec}: {count} documents, {size / 1024:.1f} KB compressed")
+        print(f"   Path: {store.path}")
+    elif args.command == "show":
+        from search import workspace_key
+
+        text = store.get_path(workspace_key(args.path))
+        print(text if text is not None else f"❌ Not in the text store: {args.path}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
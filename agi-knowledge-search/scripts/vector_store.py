@@ -2,41 +2,132 @@
 """
 AGI Knowledge Vector Store Manager
 
-Manage the FAISS vector store: rebuild, stats, search, add, remove.
+Manage the FAISS vector store: rebuild, stats, search, add, remove, update.
 
 Usage:
     python vector_store.py stats
-    python vector_store.py search "query text" [--top-k 5]
-    python vector_store.py rebuild [--full]
-    python vector_store.py add <file_path>
-    python vector_store.py remove <file_path>
+    python vector_store.py search "query text" [--top-k 5] [--lexical] [--nprobe N] [--ef-search N]
+                                  [--type TYPE] [--date-after DATE]
+    python vector_store.py similar <file_path> [--top-k 5] [--type TYPE] [--date-after DATE]
+    python vector_store.py rebuild [--full] [--index-type auto|flat|hnsw|ivf|ivfsq8|ivfpq]
+                                   [--dim 768|1536|3072] [--storage float32|float16|int8]
+                                   [--shard-by type|month]
+                                   [--batch-size 100] [--workers 4]
+    python vector_store.py migrate [--dim 768|1536|3072] [--storage float32|float16|int8]
+    python vector_store.py benchmark [--queries 200] [--dims 3072 1536 768] [--storages float32 float16 int8]
+    python vector_store.py add <file_path>...
+    python vector_store.py remove <file_path>...
+    python vector_store.py update <file_path>...
     python vector_store.py export [--format json|csv]
+
+Each save writes a new generation directory, data/index/generations/<n>/,
+holding shards/<shard>.faiss (vectors and their id map) and metadata.sqlite
+(settings and one row per document, see metastore.py). The
+generation is published by atomically repointing the data/index/current
+symlink, so readers never see a half-written store. Readers memory-map the
+index (search.read_index_mmap). The newest KEEP_GENERATIONS generations are
+kept; processes that still map an older one keep their copy until they reload.
+
+Vectors are partitioned into one shard per document type (report, paper,
+post), or with `rebuild --shard-by month` per type and month. Each shard has
+its own index type, resolved from its own size. A save writes only the shards
+that changed; unchanged shard files are hard-linked from the previous
+generation, so re-indexing posts never rewrites, retrains or re-maps the
+paper index. Queries fan out over the shards (search.ShardedIndex).
+Single-index stores of earlier versions are split into shards on the next
+write.
+
+Documents are split into overlapping passages (chunker.py) and every chunk is
+embedded. Vectors live in an `IndexIDMap2`; a vector id is the stable
+per-document id recorded in the metadata shifted left by CHUNK_BITS, plus the
+chunk number, so chunk -> document resolution needs no lookup table and a
+document's vectors form one contiguous id range. `rebuild` diffs content hashes against the stored metadata and
+only embeds new or changed files; `rebuild --full` rebuilds the index from
+scratch. Document embeddings go through the shared cache in embeddings.py, so
+text that was embedded before is never sent to the API again.
+
+Index types trade recall for speed and memory:
+
+    flat     exhaustive inner-product scan (exact)
+    hnsw     HNSW graph, tuned with --ef-search (removals rebuild the graph)
+    ivf      inverted file over k-means cells, tuned with --nprobe
+    ivfsq8   IVF with 8-bit scalar-quantized vectors (4x smaller)
+    ivfpq    IVF with product quantization (~100x smaller, lowest recall)
+    auto     picked from the chunk count (see AUTO_INDEX_THRESHOLDS)
+
+Vectors can be stored at a reduced dimension (the embedding model is
+Matryoshka-trained, so the leading 768 or 1536 components of a vector are a
+usable embedding once re-normalized) and as float16 or int8 scalar-quantized
+codes. 768 dims in float16 take 1/8 of the memory of 3072 dims in float32.
+New texts are embedded at the reduced dimension directly; vectors already
+in the embedding cache at full dimension are truncated locally.
+
+The requested index type, dimension and storage are remembered in the
+store settings; switching any of them during `rebuild` rebuilds the index from
+the embedding cache without calling the API. `migrate` converts the existing
+index from its own vectors (down-projection only), and
+`benchmark` reports recall@10 of each dimension/storage combination against
+the full-precision float32 baseline, using stored passages as queries.
+
+`rebuild` also refreshes the BM25 full-text index (fulltext.py), and
+`search --lexical` queries that index instead of the embeddings.
 """
 
 import argparse
+import fcntl
 import hashlib
 import json
 import os
+import shutil
 import sys
+import tempfile
 import time
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError
 
 import faiss
 import numpy as np
 
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from chunker import chunk_texts, CHUNK_BITS
+from manifest import corpus_files, load_manifest, Manifest
+from dedup import is_near, simhash, SimHashIndex, MAX_DISTANCE
+from metastore import document_shard, read_metadata, type_counts, vector_count, write_metadata, METADATA_DB
+from textstore import section_offsets, TextStore
+from embeddings import (
+    embed_many, default_query_cache, EMBEDDING_DIM, EMBEDDING_DIMS, BATCH_SIZE, WORKERS
+)
+from search import (
+    extract_metadata, extract_text, read_index_mmap, reconstruct, search_documents, shard_file, similar_documents,
+    store_dir, workspace_key, ShardedIndex, VectorMap, DEFAULT_NPROBE, DEFAULT_EF_SEARCH, INDEX_FILE,
+    METADATA_FILE, SHARDS_DIR
+)
+
 WORKSPACE = Path("/config/.openclaw/workspace")
 MEMORY_DOCS = WORKSPACE / "memory/docs"
 DATA_PAPERS = WORKSPACE / "data/papers"
 DATA_X = WORKSPACE / "data/x"
 INDEX_DIR = WORKSPACE / "data/index"
-FAISS_INDEX_FILE = INDEX_DIR / "knowledge.faiss"
-METADATA_FILE = INDEX_DIR / "metadata.json"
-EMBEDDING_MODEL = "models/gemini-embedding-001"
-EMBEDDING_DIM = 3072
+GENERATIONS_DIR = INDEX_DIR / "generations"
+CURRENT_LINK = INDEX_DIR / "current"
+WRITER_LOCK = INDEX_DIR / ".writer.lock"
+KEEP_GENERATIONS = 3
+STORE_VERSION = "4.0"
+
+INDEX_TYPES = ["auto", "flat", "hnsw", "ivf", "ivfsq8", "ivfpq"]
+# auto: largest chunk count for which each type is chosen
+AUTO_INDEX_THRESHOLDS = [(20_000, "flat"), (100_000, "hnsw"), (1_000_000, "ivfsq8")]
+IVF_MIN_TRAIN = 1_000   # below this many vectors IVF types fall back to flat
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+
+STORAGE_TYPES = ["float32", "float16", "int8"]
+SHARD_KEYS = ["type", "month"]
+SQ_TYPES = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
 
 
 def get_api_key() -> Optional[str]:
@@ -52,52 +143,242 @@ def get_api_key() -> Optional[str]:
     return None
 
 
-def get_embedding(text: str, api_key: str) -> Optional[list[float]]:
-    if len(text) > 8000:
-        text = text[:8000]
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{EMBEDDING_MODEL}:embedContent?key={api_key}"
-    payload = {"model": EMBEDDING_MODEL, "content": {"parts": [{"text": text}]}}
-    try:
-        req = Request(url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
-        with urlopen(req, timeout=30) as resp:
-            return json.loads(resp.read().decode()).get("embedding", {}).get("values", [])
-    except HTTPError as e:
-        if e.code == 429:
-            return "rate_limited"
-        print(f"⚠️ API error: {e.code}", file=sys.stderr)
-        return None
-    except Exception as e:
-        print(f"⚠️ Error: {e}", file=sys.stderr)
-        return None
-
-
-def extract_text(content: str) -> str:
-    import re
-    if content.startswith("---"):
-        parts = content.split("---", 2)
-        if len(parts) >= 3:
-            content = parts[2]
-    content = re.sub(r"```[\s\S]*?```", "", content)
-    content = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", content)
-    content = re.sub(r"^#+\s*", "", content, flags=re.MULTILINE)
-    return " ".join(content.split())
+@contextmanager
+def writer_lock():
+    """Serialize store writers across processes (rebuild/add/remove/migrate and watcher.py)."""
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    with open(WRITER_LOCK, "a+") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
 
 
 def load_store():
-    """Load existing FAISS index and metadata."""
-    if not FAISS_INDEX_FILE.exists() or not METADATA_FILE.exists():
+    """Load the `ShardedIndex` and metadata, upgrading older store layouts.
+
+    Shards are memory-mapped read-only; a writer takes a heap copy of the ones
+    it modifies with `writable_shard`. A single-index store is split into
+    shards in memory (all of them dirty, so the next save writes them).
+    """
+    directory = store_dir(INDEX_DIR)
+    db_file, json_file = directory / METADATA_DB, directory / METADATA_FILE
+    if not (db_file.exists() or json_file.exists()):
         return None, None
-    index = faiss.read_index(str(FAISS_INDEX_FILE))
-    meta = json.loads(METADATA_FILE.read_text())
-    return index, meta
+    meta = read_metadata(db_file) if db_file.exists() else json.loads(json_file.read_text())
+    if "shards" in meta:
+        shards = {name: read_index_mmap(shard_file(directory, name)) for name in meta["shards"]}
+        return ShardedIndex(shards, meta.get("shard_by", "type"), meta.get("dimension", 0), directory), meta
+    if not (directory / INDEX_FILE).exists():
+        return None, None
+    index = faiss.read_index(str(directory / INDEX_FILE))
+    if meta.get("version") != STORE_VERSION:
+        index, meta = upgrade_store(index, meta)
+    return split_shards(index, meta, meta.get("shard_by", "type")), meta
 
 
-def save_store(index, meta):
-    """Save FAISS index and metadata."""
-    INDEX_DIR.mkdir(parents=True, exist_ok=True)
-    faiss.write_index(index, str(FAISS_INDEX_FILE))
+def split_shards(index, meta: dict, shard_by: str) -> ShardedIndex:
+    """Partition a single index into shards by document (see metastore.document_shard)."""
+    sharded = ShardedIndex({}, shard_by, index.d)
+    ids, vectors = index_vectors(index)
+    shard_of_doc = {info["id"]: document_shard(info, shard_by) for info in meta.get("files", {}).values()}
+    names = np.array([shard_of_doc.get(int(doc_id), "") for doc_id in ids >> CHUNK_BITS])
+    for name in sorted(set(names) - {""}):
+        mask = names == name
+        shard = new_index(index.d, resolve_index_type(meta.get("index_type", "auto"), int(mask.sum())),
+                          int(mask.sum()), meta.get("storage", "float32"))
+        fill_index(shard, ids[mask], vectors[mask])
+        sharded.shards[name] = shard
+        sharded.dirty.add(name)
+    return sharded
+
+
+def writable_shard(index: ShardedIndex, name: str):
+    """A shard ready to be modified: a heap copy of a mapped shard, marked dirty. None if it does not exist."""
+    if name not in index.dirty and name in index.shards:
+        index.shards[name] = faiss.read_index(str(shard_file(index.directory, name)))
+    index.dirty.add(name)
+    return index.shards.get(name)
+
+
+def resolve_index_type(index_type: str, n_vectors: int) -> str:
+    """Concrete index type for a requested type and corpus size."""
+    if index_type == "auto":
+        for limit, name in AUTO_INDEX_THRESHOLDS:
+            if n_vectors <= limit:
+                return name
+        return "ivfpq"
+    if index_type.startswith("ivf") and n_vectors < IVF_MIN_TRAIN:
+        return "flat"
+    return index_type
+
+
+def index_layout(index_type: str, storage: str = "float32") -> tuple[str, str]:
+    """Canonical (structure, vector storage) of a concrete index type.
+
+    `ivfsq8` is IVF with int8 storage; `ivfpq` has its own (PQ) storage.
+    """
+    if index_type == "ivfsq8":
+        return "ivf", "int8"
+    if index_type == "ivfpq":
+        return "ivfpq", "pq"
+    return index_type, storage
+
+
+def new_index(dim: int = EMBEDDING_DIM, index_type: str = "flat", n_vectors: int = 0,
+              storage: str = "float32"):
+    """Create an empty index of a concrete type, addressed by stable chunk ids.
+
+    IVF types size their coarse quantizer from `n_vectors`. IVF indexes and
+    int8 storage must be trained before vectors are added.
+    """
+    kind, storage = index_layout(index_type, storage)
+    qtype = SQ_TYPES.get(storage)
+    if kind == "hnsw":
+        if qtype is None:
+            base = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        else:
+            base = faiss.IndexHNSWSQ(dim, qtype, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        base.hnsw.efSearch = DEFAULT_EF_SEARCH
+    elif kind.startswith("ivf"):
+        nlist = max(1, min(int(4 * n_vectors ** 0.5), n_vectors // 39))
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivfpq":
+            m = max(k for k in range(1, 97) if dim % k == 0)
+            base = faiss.IndexIVFPQ(quantizer, dim, nlist, m, 8, faiss.METRIC_INNER_PRODUCT)
+        elif qtype is None:
+            base = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            base = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype, faiss.METRIC_INNER_PRODUCT)
+        base.nprobe = min(DEFAULT_NPROBE, nlist)
+    elif qtype is None:
+        base = faiss.IndexFlatIP(dim)
+    else:
+        base = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+    return faiss.IndexIDMap2(base)
+
+
+def layout_of(index) -> tuple[str, str]:
+    """(structure, vector storage) of an existing index, as in `index_layout`."""
+    base = faiss.downcast_index(index.index)
+    storage_of = {qtype: name for name, qtype in SQ_TYPES.items()}
+    if isinstance(base, faiss.IndexHNSW):
+        codes = faiss.downcast_index(base.storage)
+        return "hnsw", storage_of.get(codes.sq.qtype) if hasattr(codes, "sq") else "float32"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivfpq", "pq"
+    if isinstance(base, faiss.IndexIVFScalarQuantizer):
+        return "ivf", storage_of.get(base.sq.qtype, "float32")
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf", "float32"
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "flat", storage_of.get(base.sq.qtype, "float32")
+    return "flat", "float32"
+
+
+def index_vectors(index) -> tuple[np.ndarray, np.ndarray]:
+    """All (ids, vectors) of an index; quantized vectors come back decoded."""
+    base = faiss.downcast_index(index.index)
+    if isinstance(base, faiss.IndexIVF):
+        base.make_direct_map()
+    return faiss.vector_to_array(index.id_map), base.reconstruct_n(0, index.ntotal)
+
+
+def reduce_vectors(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Truncate vectors to their leading `dim` components and re-normalize."""
+    out = np.ascontiguousarray(vectors[:, :dim], dtype=np.float32)
+    faiss.normalize_L2(out)
+    return out
+
+
+def fill_index(index, ids: np.ndarray, vectors: np.ndarray):
+    """Train the index on `vectors` if it needs it, then add them."""
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, ids)
+
+
+def new_meta(index_type: str = "auto", embedding_dim: int = EMBEDDING_DIM,
+             storage: str = "float32") -> dict:
+    return {"version": STORE_VERSION, "chunk_bits": CHUNK_BITS, "index_type": index_type,
+            "embedding_dim": embedding_dim, "storage": storage, "next_id": 0, "files": {}}
+
+
+def upgrade_store(index, meta):
+    """Replace a pre-4.0 store, which holds one vector per document, with an empty chunked one.
+
+    Its vectors cover only the first 2000 characters of each document and
+    cannot be reused, so every file is re-embedded as chunks on the next sync.
+    """
+    print(f"🔄 Store {meta.get('version', '1.0')} predates chunking; "
+          f"{len(meta.get('files', {}))} documents will be re-embedded as passages")
+    return new_index(index.d), new_meta(meta.get("index_type", "auto"), index.d)
+
+
+def chunk_ids(doc_id: int, n_chunks: int) -> np.ndarray:
+    return (np.int64(doc_id) << CHUNK_BITS) + np.arange(n_chunks, dtype=np.int64)
+
+
+def remove_documents(index, doc_ids: list[int]):
+    """Remove every chunk vector of the given documents (one id range each).
+
+    HNSW graphs cannot delete, so they are rebuilt from their remaining
+    (exactly stored) vectors instead. Returns the index to keep using.
+    """
+    if not doc_ids or not index.ntotal:
+        return index
+    kind, storage = layout_of(index)
+    if kind == "hnsw":
+        ids, vectors = index_vectors(index)
+        keep = ~np.isin(ids >> CHUNK_BITS, np.array(doc_ids, dtype=np.int64))
+        rebuilt = new_index(index.d, kind, storage=storage)
+        if keep.any():
+            fill_index(rebuilt, ids[keep], vectors[keep])
+        return rebuilt
+    for doc_id in doc_ids:
+        index.remove_ids(faiss.IDSelectorRange(doc_id << CHUNK_BITS, (doc_id + 1) << CHUNK_BITS))
+    return index
+
+
+def save_store(index: ShardedIndex, meta):
+    """Save the shards and metadata as a new generation and publish it."""
+    GENERATIONS_DIR.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=GENERATIONS_DIR))
+    os.chmod(staging, 0o755)
+    try:
+        write_generation(staging, index, meta)
+        index.directory, index.dirty = publish_generation(staging), set()
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    prune_generations()
+
+
+def write_generation(directory: Path, index: ShardedIndex, meta):
+    """Write the shards and metadata into `directory` and flush them to disk.
+
+    Shards that are not dirty are hard-linked from the generation they were
+    read from (copied where linking is not possible); empty shards are dropped.
+    """
+    (directory / SHARDS_DIR).mkdir()
+    written = [directory / METADATA_DB]
+    shards = {name: shard for name, shard in sorted(index.shards.items()) if shard.ntotal}
+    for name, shard in shards.items():
+        target = shard_file(directory, name)
+        source = shard_file(index.directory, name) if index.directory else None
+        if name not in index.dirty and source is not None and source.exists():
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copyfile(source, target)
+                written.append(target)
+        else:
+            faiss.write_index(shard, str(target))
+            written.append(target)
     # Strip embeddings from metadata before saving
-    clean_meta = {"version": meta.get("version", "2.0")}
+    clean_meta = {"version": meta.get("version", STORE_VERSION)}
     for k, v in meta.items():
         if k in ("version",):
             continue
@@ -105,10 +386,62 @@ def save_store(index, meta):
             clean_meta[k] = {kk: vv for kk, vv in v.items() if kk != "embedding"}
         else:
             clean_meta[k] = v
-    clean_meta["total_documents"] = index.ntotal
+    # Totals served by the API's /stats without scanning the corpus
+    files = meta.get("files", {})
+    clean_meta["total_documents"] = len(files)
+    clean_meta["type_counts"] = type_counts(files)
+    clean_meta["duplicate_documents"] = sum(1 for info in files.values() if info.get("duplicate_of") is not None)
+    clean_meta["total_vectors"] = index.ntotal
+    clean_meta["shard_vectors"] = {name: shard.ntotal for name, shard in shards.items()}
     clean_meta["dimension"] = index.d
+    clean_meta["shard_by"] = index.shard_by
+    clean_meta["shards"] = list(shards)
     clean_meta["updated"] = datetime.now().isoformat()
-    METADATA_FILE.write_text(json.dumps(clean_meta, indent=2, ensure_ascii=False))
+    write_metadata(directory / METADATA_DB, clean_meta)
+    for path in written:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def generation_numbers() -> list[int]:
+    return sorted(int(p.name) for p in GENERATIONS_DIR.iterdir() if p.name.isdigit())
+
+
+def publish_generation(staging: Path) -> Path:
+    """Rename a written staging directory to the next generation and point `current` at it."""
+    while True:
+        numbers = generation_numbers()
+        target = GENERATIONS_DIR / f"{(numbers[-1] + 1 if numbers else 1):06d}"
+        try:
+            os.rename(staging, target)  # fails if a concurrent writer took the number
+            break
+        except OSError:
+            if not target.exists():
+                raise
+    link = INDEX_DIR / f".current.{os.getpid()}"
+    if link.is_symlink():
+        link.unlink()
+    link.symlink_to(target.relative_to(INDEX_DIR))
+    os.replace(link, CURRENT_LINK)
+    # Files of the pre-generation layout are superseded
+    for name in (INDEX_FILE, METADATA_FILE):
+        (INDEX_DIR / name).unlink(missing_ok=True)
+    return target
+
+
+def prune_generations(keep: int = KEEP_GENERATIONS):
+    """Delete all but the newest `keep` generations (never the published one) and stale staging dirs."""
+    current = CURRENT_LINK.resolve()
+    for n in generation_numbers()[:-keep]:
+        path = GENERATIONS_DIR / f"{n:06d}"
+        if path != current:
+            shutil.rmtree(path, ignore_errors=True)
+    for staging in GENERATIONS_DIR.glob(".staging-*"):
+        if time.time() - staging.stat().st_mtime > 3600:
+            shutil.rmtree(staging, ignore_errors=True)
 
 
 def cmd_stats(args):
@@ -123,14 +456,35 @@ def cmd_stats(args):
             t = v.get("type", "unknown")
             types[t] = types.get(t, 0) + 1
     print(f"📊 Vector Store Statistics")
-    print(f"   Documents: {index.ntotal}")
+    duplicates = sum(1 for v in files_meta.values() if isinstance(v, dict) and v.get("duplicate_of") is not None)
+    print(f"   Documents: {len(files_meta)} ({duplicates} near-duplicates, not embedded)")
+    print(f"   Chunks: {index.ntotal}")
+    print(f"   Index type requested: {meta.get('index_type', 'auto')}")
     print(f"   Dimension: {index.d}")
-    print(f"   Index size: {FAISS_INDEX_FILE.stat().st_size / 1024:.1f} KB")
+    print(f"   Storage: {meta.get('storage', 'float32')}")
+    print(f"   Shards (by {index.shard_by}):")
+    for name, shard in sorted(index.shards.items()):
+        print(f"     {name}: {'/'.join(layout_of(shard))}, {shard.ntotal} chunks")
+    print(f"   Index size: {shards_size(index) / 1024:.1f} KB")
+    print(f"   Generation: {store_dir(INDEX_DIR).name}")
     print(f"   Updated: {meta.get('updated', 'unknown')}")
     print(f"   By type: {types}")
 
 
+def cmd_search_lexical(args):
+    from fulltext import load_index
+
+    index = load_index(find_files())
+
+    print(f"\n🔍 Results for: \"{args.query}\" (BM25)\n")
+    for i, (info, score) in enumerate(index.search(args.query, args.top_k, args.type, args.date_after)):
+        print(f"  {i+1}. [{info['type']}] {info['title']} (score: {score:.4f})")
+        print(f"     {info['path']}\n")
+
+
 def cmd_search(args):
+    if args.lexical:
+        cmd_search_lexical(args); return
     api_key = get_api_key()
     if not api_key:
         print("❌ No API key"); return
@@ -138,79 +492,563 @@ def cmd_search(args):
     if index is None:
         print("❌ No vector store"); return
 
-    query_embedding = get_embedding(args.query, api_key)
-    if not query_embedding or query_embedding == "rate_limited":
+    query_embedding = default_query_cache().embed(args.query, api_key)
+    if not query_embedding:
         print("❌ Failed to get embedding"); return
 
-    q = np.array([query_embedding], dtype=np.float32)
-    faiss.normalize_L2(q)
-    scores, ids = index.search(q, args.top_k)
-
-    files_meta = meta.get("files", {})
-    file_list = list(files_meta.items())
+    q = reduce_vectors(np.array([query_embedding], dtype=np.float32), index.d)
+    vector_map = VectorMap(meta.get("files", {}), meta.get("chunk_bits", 0))
 
     print(f"\n🔍 Results for: \"{args.query}\"\n")
-    for i, (score, idx) in enumerate(zip(scores[0], ids[0])):
-        if idx < 0 or idx >= len(file_list):
+    hits = search_documents(index, vector_map, q, args.top_k, nprobe=args.nprobe, ef_search=args.ef_search,
+                            doc_type=args.type, date_after=args.date_after)
+    for i, (path, info, score, chunk) in enumerate(hits):
+        print(f"  {i+1}. [{info.get('type','?')}] {info.get('title', path)} (score: {score:.4f}, chunk {chunk})")
+        print(f"     {path}")
+        for dup in vector_map.duplicates(info):
+            print(f"     ≈ {dup}")
+        print()
+
+
+def cmd_similar(args):
+    index, meta = load_store()
+    if index is None:
+        print("❌ No vector store"); return
+    vector_map = VectorMap(meta.get("files", {}), meta.get("chunk_bits", 0))
+    path = workspace_key(args.file_path)
+    hits = similar_documents(index, vector_map, path, args.top_k, nprobe=args.nprobe,
+                             ef_search=args.ef_search, doc_type=args.type, date_after=args.date_after)
+    if hits is None:
+        print(f"❌ Not in the vector store: {path}"); return
+
+    print(f"\n🔗 Similar to: {path}\n")
+    for i, (hit_path, info, score, chunk) in enumerate(hits):
+        print(f"  {i+1}. [{info.get('type','?')}] {info.get('title', hit_path)} (score: {score:.4f})")
+        print(f"     {hit_path}\n")
+
+
+def find_files() -> list[Path]:
+    """All markdown files of the knowledge base (see manifest.py)."""
+    return corpus_files()
+
+
+def file_key(fp: Path) -> str:
+    """Store key of a file: its path relative to the workspace."""
+    return str(Path(fp).resolve().relative_to(WORKSPACE))
+
+
+def file_type(key: str) -> str:
+    return "report" if "memory/docs" in key else "paper" if "data/papers" in key else "post"
+
+
+def pending_document(key: str, content: str, text: str, fm: dict, content_hash: str) -> tuple:
+    """(key, frontmatter, hash, spans, chunks, text, sections, simhash) of a document to (re-)index."""
+    title = fm.get("title", Path(key).stem)
+    spans, chunks = chunk_texts(content, text, title)
+    if not chunks:
+        spans, chunks = [(0, 0)], [title]
+    return key, fm, content_hash, spans, chunks, text, section_offsets(content, text), simhash(text)
+
+
+def assign_duplicates(files_meta: dict, pending: list[tuple], gone: set, load_orphan) -> dict[str, str]:
+    """Map each near-duplicate among the `pending` documents to the key of its canonical document.
+
+    Canonical candidates are the stored documents that stay (not `gone`, not
+    re-indexed, not duplicates themselves), then pending documents in order.
+    Stored duplicates whose canonical goes away or drifts apart are orphans:
+    `load_orphan(key)` returns their pending entry (or None), which is appended
+    to `pending` and classified the same way.
+    """
+    pending_keys = {p[0] for p in pending}
+    canon = SimHashIndex()
+    for key, info in files_meta.items():
+        if (key not in gone and key not in pending_keys and info.get("duplicate_of") is None
+                and info.get("simhash") is not None):
+            canon.add(key, info["simhash"])
+
+    duplicate_of = {}
+
+    def classify(entry: tuple):
+        key, sig = entry[0], entry[-1]
+        match = canon.find(sig)
+        if match is not None:
+            duplicate_of[key] = match
+        elif sig is not None:
+            canon.add(key, sig)
+
+    for entry in pending:
+        classify(entry)
+    keys_by_id = {info["id"]: key for key, info in files_meta.items()}
+    for key, info in list(files_meta.items()):
+        if info.get("duplicate_of") is None or key in gone or key in pending_keys:
+            continue
+        target = keys_by_id.get(info["duplicate_of"])
+        if target in canon and is_near(canon.signatures[target], info.get("simhash")):
+            continue
+        entry = load_orphan(key)
+        if entry is not None:
+            pending.append(entry)
+            classify(entry)
+    return duplicate_of
+
+
+def sync_store(files: list[Path], api_key: str, full: bool = False, prune: bool = True,
+               batch_size: int = BATCH_SIZE, workers: int = WORKERS,
+               index_type: Optional[str] = None, dim: Optional[int] = None,
+               storage: Optional[str] = None, manifest: Optional[Manifest] = None,
+               shard_by: Optional[str] = None) -> dict:
+    """Bring the vector store in line with `files`, embedding only what changed.
+
+    Unchanged files (same content hash) keep their vectors and ids; changed
+    files are re-chunked and re-embedded under their existing id, in concurrent
+    batches of `batch_size` (see embeddings.embed_many). With `prune`, indexed
+    files missing from `files` are removed. Returns counts per outcome.
+
+    `index_type` (default: the type recorded in the store, else "auto") is
+    resolved per shard against the shard's resulting chunk count; `dim`,
+    `storage` and `shard_by` likewise default to the store's settings. Only
+    shards whose vectors change are rewritten. A full sync (`prune`) rebuilds a
+    shard whose resolved layout differs from its current index from the
+    embedding cache; add/update keep the existing shards. Changing `shard_by`
+    rebuilds the whole store.
+
+    With a refreshed `manifest`, files whose manifest hash matches the store
+    are skipped without being read.
+
+    The plain text of every embedded document is written to the text store
+    (textstore.py); unchanged documents missing from it are backfilled.
+
+    Near-duplicates (dedup.py) of a stored or earlier pending document are not
+    embedded: they are recorded with no vectors and `duplicate_of` pointing at
+    that canonical document, and search results list them under it.
+    """
+    index, meta = (None, None) if full else load_store()
+    settings = meta or {}
+    requested = index_type or settings.get("index_type", "auto")
+    dim = dim or settings.get("embedding_dim", EMBEDDING_DIM)
+    storage = storage or settings.get("storage", "float32")
+    shard_by = shard_by or settings.get("shard_by", "type")
+    if index is not None and index.shard_by != shard_by:
+        print(f"🔁 Re-sharding by {shard_by} (was {index.shard_by})")
+        return sync_store(files, api_key, full=True, prune=prune, batch_size=batch_size, workers=workers,
+                          index_type=requested, dim=dim, storage=storage, manifest=manifest, shard_by=shard_by)
+    if meta is None:
+        meta = new_meta(requested, dim, storage)
+    if index is None:
+        index = ShardedIndex({}, shard_by, dim)
+    meta.update(index_type=requested, embedding_dim=dim, storage=storage)
+    files_meta = meta["files"]
+    # Shard of every stored document as of its stored metadata (dates may change below)
+    old_shards = {key: document_shard(info, shard_by) for key, info in files_meta.items()}
+    counts = {"unchanged": 0, "added": 0, "updated": 0, "removed": 0, "duplicates": 0, "failed": 0}
+    seen, unchanged = set(), set()
+    dirty = False
+    pending = []
+    text_store = TextStore(readonly=False)
+    stored_ids = text_store.ids()
+    text_rows = []
+    # Stores written before near-duplicate detection get signatures for every document once
+    sign_all = meta.get("near_duplicates") != MAX_DISTANCE
+    if sign_all:
+        meta["near_duplicates"] = MAX_DISTANCE
+        dirty = True
+
+    for fp in files:
+        key = file_key(fp)
+        seen.add(key)
+        info = files_meta.get(key)
+        entry = manifest.files.get(key) if manifest else None
+        if info and entry and info.get("hash") == entry["hash"] and info["id"] in stored_ids:
+            fields = {"title": entry["title"], "date": entry["date"]}
+            if any(info.get(k) != v for k, v in fields.items()):
+                info.update(fields)
+                dirty = True
+            if sign_all:
+                info["simhash"] = simhash(text_store.get(info["id"]) or "")
+            unchanged.add(key)
+            continue
+        try:
+            content = fp.read_text(encoding="utf-8")
+        except Exception:
+            counts["failed"] += 1; continue
+        text = extract_text(content)
+        fm = extract_metadata(content)
+        content_hash = hashlib.md5(text.encode()).hexdigest()
+        if info and info.get("hash") == content_hash:
+            # Frontmatter is not part of the hashed text; keep title/date current
+            fields = {"title": fm.get("title", fp.stem), "date": fm.get("date", "")}
+            if any(info.get(k) != v for k, v in fields.items()):
+                info.update(fields)
+                dirty = True
+            if sign_all:
+                info["simhash"] = simhash(text)
+            if info["id"] not in stored_ids:
+                text_rows.append((info["id"], key, content_hash, text, section_offsets(content, text)))
+            unchanged.add(key)
+            continue
+        pending.append(pending_document(key, content, text, fm, content_hash))
+
+    # Near-duplicates are not embedded; duplicates of removed or changed documents are re-classified
+    gone = {k for k in files_meta if k not in seen} if prune else set()
+
+    def read_pending(key: str):
+        try:
+            content = (WORKSPACE / key).read_text(encoding="utf-8")
+        except Exception:
+            return None
+        text = extract_text(content)
+        return pending_document(key, content, text, extract_metadata(content), hashlib.md5(text.encode()).hexdigest())
+
+    def load_orphan(key: str):
+        doc = read_pending(key)
+        if doc is not None:
+            unchanged.discard(key)
+        return doc
+
+    duplicate_of = assign_duplicates(files_meta, pending, gone, load_orphan)
+
+    def pending_shard(doc: tuple) -> str:
+        key, fm = doc[0], doc[1]
+        return document_shard({"type": file_type(key), "date": fm.get("date", ""),
+                               "title": fm.get("title", Path(key).stem)}, shard_by)
+
+    embed = [p for p in pending if p[0] not in duplicate_of]
+    sizes = {}
+    pending_keys = {p[0] for p in pending}
+    for key, info in files_meta.items():
+        if key not in gone and key not in pending_keys and vector_count(info):
+            name = document_shard(info, shard_by)
+            sizes[name] = sizes.get(name, 0) + vector_count(info)
+    for doc in embed:
+        sizes[pending_shard(doc)] = sizes.get(pending_shard(doc), 0) + len(doc[4])
+    resolved = {name: resolve_index_type(requested, n) for name, n in sizes.items()}
+    if index.ntotal and not prune:
+        dim = index.d
+
+    # A shard whose layout no longer fits its size (or the requested dim/storage)
+    # is rebuilt; its unchanged documents are re-embedded from the cache
+    rebuilt = set()
+    if prune:
+        for name, shard in list(index.shards.items()):
+            layout = index_layout(resolved[name], storage) if name in resolved else None
+            if layout and (layout_of(shard), shard.d) != (layout, dim):
+                print(f"🔁 Rebuilding shard {name}: {'/'.join(layout_of(shard))}/{shard.d} → "
+                      f"{'/'.join(layout)}/{dim} ({sizes[name]} chunks)")
+                del index.shards[name]
+                index.dirty.add(name)
+                rebuilt.add(name)
+    reembed, moved = [], []
+    for key in sorted(unchanged):
+        info = files_meta[key]
+        if not vector_count(info):
+            continue
+        old, new = old_shards.get(key), document_shard(info, shard_by)
+        if old in rebuilt or new in rebuilt:
+            doc = read_pending(key)
+            if doc is None:
+                files_meta.pop(key); unchanged.discard(key); counts["failed"] += 1
+            else:
+                reembed.append(doc)
+        elif old != new:
+            moved.append(key)
+
+    texts = [c for _, _, _, _, chunks, _, _, _ in embed + reembed for c in chunks]
+    if texts:
+        print(f"🧠 Embedding {len(texts)} chunks of {len(embed) + len(reembed)} new/changed files...")
+        vectors = embed_many(
+            texts, api_key, dim=dim if dim != EMBEDDING_DIM else None,
+            batch_size=batch_size, workers=workers,
+            progress=lambda done, total: print(f"  {done}/{total} embedded"),
+        )
+    else:
+        vectors = []
+
+    pos = 0
+    removals, additions, embedded = {}, {}, set()
+
+    def add_vectors(name: str, ids: np.ndarray, vecs: np.ndarray):
+        shard_ids, shard_vecs = additions.setdefault(name, ([], []))
+        shard_ids.append(ids)
+        shard_vecs.append(vecs)
+
+    def remove_vectors(key: str, info: dict):
+        if vector_count(info) and old_shards.get(key) not in rebuilt:
+            removals.setdefault(old_shards[key], []).append(info["id"])
+
+    for doc in pending:
+        key, fm, content_hash, spans, chunks, text, sections, sig = doc
+        canonical = duplicate_of.get(key)
+        if canonical is None:
+            embs = vectors[pos:pos + len(chunks)]
+            pos += len(chunks)
+            if not all(embs):
+                counts["failed"] += 1; continue
+            embedded.add(key)
+        elif canonical in pending_keys and canonical not in embedded:
+            # Its canonical failed to embed; retried with it on the next sync
+            counts["failed"] += 1; continue
+        info = files_meta.get(key)
+        if info:
+            doc_id = info["id"]
+            remove_vectors(key, info)
+            counts["updated"] += 1
+        else:
+            doc_id = meta["next_id"]
+            meta["next_id"] += 1
+            counts["added"] += 1
+        files_meta[key] = {
+            "id": doc_id,
+            "title": fm.get("title", Path(key).stem),
+            "type": file_type(key),
+            "date": fm.get("date", ""),
+            "hash": content_hash,
+            "chunks": [list(span) for span in spans],
+            "simhash": sig,
+        }
+        if canonical is None:
+            add_vectors(pending_shard(doc), chunk_ids(doc_id, len(embs)),
+                        reduce_vectors(np.array(embs, dtype=np.float32), dim))
+        else:
+            files_meta[key].update(chunks=[], duplicate_of=files_meta[canonical]["id"])
+            counts["duplicates"] += 1
+        text_rows.append((doc_id, key, content_hash, text, sections))
+
+    for key, _, _, spans, chunks, _, _, _ in reembed:
+        info = files_meta[key]
+        embs = vectors[pos:pos + len(chunks)]
+        pos += len(chunks)
+        remove_vectors(key, info)
+        if not all(embs):
+            files_meta.pop(key); unchanged.discard(key); counts["failed"] += 1
             continue
-        path, info = file_list[idx]
-        print(f"  {i+1}. [{info.get('type','?')}] {info.get('title', path)} (score: {score:.4f})")
-        print(f"     {path}\n")
+        info["chunks"] = [list(span) for span in spans]
+        add_vectors(document_shard(info, shard_by), chunk_ids(info["id"], len(embs)),
+                    reduce_vectors(np.array(embs, dtype=np.float32), dim))
+
+    # Documents whose date moved them to another month shard take their vectors along
+    for key in moved:
+        info = files_meta[key]
+        ids = chunk_ids(info["id"], vector_count(info))
+        add_vectors(document_shard(info, shard_by), ids, reconstruct(index.shards[old_shards[key]], ids))
+        remove_vectors(key, info)
+    counts["unchanged"] = len(unchanged)
+
+    if prune:
+        for key in gone:
+            remove_vectors(key, files_meta.pop(key))
+        counts["removed"] = len(gone)
+
+    if text_rows:
+        text_store.put_many(text_rows)
+    if prune:
+        text_store.retain(info["id"] for info in files_meta.values())
+    text_store.close()
+
+    for name, doc_ids in removals.items():
+        shard = writable_shard(index, name)
+        if shard is not None:
+            index.shards[name] = remove_documents(shard, doc_ids)
+    for name, (ids, vecs) in sorted(additions.items()):
+        shard = writable_shard(index, name)
+        if shard is None:
+            shard = index.shards[name] = new_index(dim, resolved.get(name, "flat"), sizes.get(name, 0), storage)
+        vecs = np.concatenate(vecs)
+        if not shard.is_trained:
+            print(f"🏋️ Training {resolved.get(name)} shard {name} on {len(vecs)} vectors...")
+        fill_index(shard, np.concatenate(ids), vecs)
+
+    if dirty or index.dirty or counts["added"] or counts["updated"] or counts["removed"] or "shards" not in settings:
+        save_store(index, meta)
+    return counts
+
+
+def remove_from_store(paths: list[Path]) -> int:
+    """Remove files from the store by path (they need not exist on disk).
+
+    Near-duplicates of a removed document keep pointing at it until the next
+    `sync_store`, which re-embeds them.
+    """
+    index, meta = load_store()
+    if index is None:
+        return 0
+    files_meta = meta["files"]
+    keys = [k for k in (file_key(p) for p in paths) if k in files_meta]
+    doc_ids, by_shard = [], {}
+    for key in keys:
+        info = files_meta.pop(key)
+        doc_ids.append(info["id"])
+        if vector_count(info):
+            by_shard.setdefault(document_shard(info, index.shard_by), []).append(info["id"])
+    for name, ids in by_shard.items():
+        shard = writable_shard(index, name)
+        if shard is not None:
+            index.shards[name] = remove_documents(shard, ids)
+    if keys:
+        save_store(index, meta)
+        text_store = TextStore(readonly=False)
+        text_store.delete(doc_ids)
+        text_store.close()
+    return len(keys)
+
+
+def print_counts(counts: dict):
+    print(f"\n✅ {counts['added']} added, {counts['updated']} updated, {counts['removed']} removed, "
+          f"{counts['unchanged']} unchanged, {counts.get('duplicates', 0)} duplicates (not embedded), "
+          f"{counts['failed']} failed")
 
 
 def cmd_rebuild(args):
-    from pathlib import Path
     api_key = get_api_key()
     if not api_key:
         print("❌ No API key"); return
 
-    all_files = []
-    for base in [MEMORY_DOCS, DATA_PAPERS, DATA_X]:
-        if base.exists():
-            for f in base.rglob("*.md"):
-                if "node_modules" in str(f) or ".vitepress/dist" in str(f) or ".vitepress/cache" in str(f):
-                    continue
-                all_files.append(f)
-
+    manifest = load_manifest()
+    all_files = manifest.paths()
     print(f"📚 Processing {len(all_files)} files...")
-    embeddings = []
-    meta = {"version": "2.0", "files": {}}
+    counts = sync_store(all_files, api_key, full=args.full, index_type=args.index_type, manifest=manifest,
+                        dim=args.dim, storage=args.storage, shard_by=args.shard_by,
+                        batch_size=args.batch_size, workers=args.workers)
+    print_counts(counts)
 
-    for i, fp in enumerate(all_files):
-        print(f"  [{i+1}/{len(all_files)}] {fp.name}...", end=" ")
-        try:
-            text = extract_text(fp.read_text(encoding="utf-8"))
-        except:
-            print("skip"); continue
-
-        for attempt in range(3):
-            emb = get_embedding(text[:2000], api_key)
-            if emb == "rate_limited":
-                time.sleep(60 * (attempt + 1)); continue
-            break
+    from fulltext import load_index
+    ft = load_index(all_files)
+    print(f"✅ Full-text index: {len(ft.docs)} documents, {len(ft.postings)} terms")
 
-        if not emb or emb == "rate_limited":
-            print("❌"); continue
-        print("✓")
-
-        embeddings.append(emb)
-        file_key = str(fp.relative_to(WORKSPACE))
-        meta["files"][file_key] = {
-            "title": fp.stem,
-            "type": "report" if "memory/docs" in str(fp) else "paper" if "data/papers" in str(fp) else "post",
-            "hash": hashlib.md5(text.encode()).hexdigest(),
-            "index": len(embeddings) - 1,
-        }
 
-    if not embeddings:
-        print("❌ No embeddings"); return
+def workspace_paths(file_paths: list[str]) -> Optional[list[Path]]:
+    """Paths given as workspace-relative or absolute (see `search.workspace_key`) as absolute
+    workspace paths; None, after saying so, if any lies outside the workspace."""
+    keys = [workspace_key(p) for p in file_paths]
+    outside = [k for k in keys if Path(k).is_absolute()]
+    if outside:
+        print(f"❌ Not in the workspace ({WORKSPACE}): {', '.join(outside)}")
+        return None
+    return [WORKSPACE / k for k in keys]
+
+
+def cmd_add(args):
+    api_key = get_api_key()
+    if not api_key:
+        print("❌ No API key"); return
+    files = workspace_paths(args.file_paths)
+    if files is None:
+        return
+    missing = [str(p) for p in files if not p.is_file()]
+    if missing:
+        print(f"❌ Not found: {', '.join(missing)}"); return
+    print_counts(sync_store(files, api_key, prune=False,
+                            batch_size=args.batch_size, workers=args.workers))
+
+
+def cmd_remove(args):
+    files = workspace_paths(args.file_paths)
+    if files is None:
+        return
+    removed = remove_from_store(files)
+    print(f"✅ Removed {removed} document(s)")
+
 
-    arr = np.array(embeddings, dtype=np.float32)
-    faiss.normalize_L2(arr)
-    index = faiss.IndexFlatIP(EMBEDDING_DIM)
-    index.add(arr)
+def shards_size(index: ShardedIndex) -> int:
+    """Bytes on disk of the shards of a saved store."""
+    return sum(shard_file(index.directory, name).stat().st_size
+               for name in index.shards if index.directory and shard_file(index.directory, name).exists())
+
+
+def cmd_migrate(args):
+    """Convert the index to another dimension/storage from its own vectors."""
+    index, meta = load_store()
+    if index is None:
+        print("❌ No vector store found. Run `rebuild` first."); return
+    dim = args.dim or index.d
+    storage = args.storage or meta.get("storage", "float32")
+    if dim > index.d:
+        print(f"❌ Store has {index.d} dims; re-embed with `rebuild --dim {dim}` instead"); return
+
+    old_dim, old_layouts = index.d, {"/".join(layout_of(shard)) for shard in index.shards.values()}
+    old_size = shards_size(index)
+    t = time.time()
+    for name in list(index.shards):
+        ids, vectors = index_vectors(index.shards[name])
+        migrated = new_index(dim, resolve_index_type(meta.get("index_type", "auto"), len(ids)), len(ids), storage)
+        if len(ids):
+            fill_index(migrated, ids, reduce_vectors(vectors, dim))
+        index.shards[name] = migrated
+        index.dirty.add(name)
+    meta.update(embedding_dim=dim, storage=storage)
     save_store(index, meta)
-    print(f"\n✅ Rebuilt: {index.ntotal} vectors")
+    new_size = shards_size(index)
+    new_layouts = {"/".join(layout_of(shard)) for shard in index.shards.values()}
+    print(f"✅ Migrated {index.ntotal} vectors in {len(index.shards)} shards: "
+          f"{','.join(sorted(old_layouts))}/{old_dim} → {','.join(sorted(new_layouts))}/{dim} in {time.time() - t:.1f}s")
+    print(f"   Index size: {old_size / 1024:.1f} KB → {new_size / 1024:.1f} KB "
+          f"({old_size / max(new_size, 1):.1f}x smaller)")
+
+
+def cmd_benchmark(args):
+    """recall@10 of reduced dimension/storage layouts against full-precision float32."""
+    index, meta = load_store()
+    if index is None:
+        print("❌ No vector store found. Run `rebuild` first."); return
+    api_key = get_api_key()
+    if not api_key:
+        print("❌ No API key"); return
+
+    # Full-precision vectors of every stored passage, from the embedding cache
+    ids, texts = [], []
+    for key, info in meta["files"].items():
+        if not vector_count(info):
+            continue
+        try:
+            content = (WORKSPACE / key).read_text(encoding="utf-8")
+        except Exception:
+            continue
+        title = extract_metadata(content).get("title", Path(key).stem)
+        _, chunks = chunk_texts(content, extract_text(content), title)
+        chunks = chunks or [title]
+        ids.extend(chunk_ids(info["id"], len(chunks)))
+        texts.extend(chunks)
+    vectors = embed_many(texts, api_key)
+    ok = [i for i, v in enumerate(vectors) if v]
+    if len(ok) < 11:
+        print("❌ Not enough embedded passages to benchmark"); return
+    ids = np.array([ids[i] for i in ok], dtype=np.int64)
+    full = np.array([vectors[i] for i in ok], dtype=np.float32)
+    faiss.normalize_L2(full)
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(ids), size=min(args.queries, len(ids)), replace=False)
+    k = min(10, len(ids) - 1)
+
+    def top_k(idx, queries):
+        # k + 1: the query passage itself is always a hit and is dropped
+        _, found = idx.search(queries, k + 1)
+        return [set(row[row != ids[q]][:k]) for q, row in zip(sample, found)]
+
+    baseline = new_index(full.shape[1])
+    baseline.add_with_ids(full, ids)
+    truth = top_k(baseline, full[sample])
+    base_bytes = faiss.serialize_index(baseline).nbytes
+
+    print(f"📏 recall@{k} over {len(sample)} queries, {len(ids)} passages "
+          f"(baseline {full.shape[1]}/float32, {base_bytes / 1024:.0f} KB)\n")
+    print(f"  {'dim':>5} {'storage':>8} {'recall':>7} {'size':>10} {'ratio':>6} {'load ms':>8} {'query ms':>9}")
+    for dim in args.dims:
+        if dim > full.shape[1]:
+            continue
+        reduced = reduce_vectors(full, dim)
+        for storage in args.storages:
+            idx = new_index(dim, "flat", len(ids), storage)
+            fill_index(idx, ids, reduced)
+            blob = faiss.serialize_index(idx)
+            t = time.perf_counter()
+            faiss.deserialize_index(blob)
+            load_ms = (time.perf_counter() - t) * 1000
+            t = time.perf_counter()
+            found = top_k(idx, reduced[sample])
+            query_ms = (time.perf_counter() - t) * 1000 / len(sample)
+            recall = sum(len(f & g) for f, g in zip(found, truth)) / (k * len(sample))
+            print(f"  {dim:>5} {storage:>8} {recall:>7.3f} {blob.nbytes / 1024:>8.0f}KB "
+                  f"{base_bytes / blob.nbytes:>5.1f}x {load_ms:>8.1f} {query_ms:>9.3f}")
 
 
 def cmd_export(args):
@@ -232,15 +1070,43 @@ def main():
 
     sub.add_parser("stats")
     s = sub.add_parser("search"); s.add_argument("query"); s.add_argument("--top-k", type=int, default=5)
-    sub.add_parser("rebuild")
+    s.add_argument("--lexical", action="store_true", help="Use the BM25 full-text index")
+    sim = sub.add_parser("similar"); sim.add_argument("file_path"); sim.add_argument("--top-k", type=int, default=5)
+    for sp in (s, sim):
+        sp.add_argument("--nprobe", type=int, help=f"IVF cells to visit (default {DEFAULT_NPROBE})")
+        sp.add_argument("--ef-search", type=int, help=f"HNSW candidate list size (default {DEFAULT_EF_SEARCH})")
+        sp.add_argument("--type", choices=["paper", "report", "post"]); sp.add_argument("--date-after")
+    r = sub.add_parser("rebuild"); r.add_argument("--full", action="store_true", help="Rebuild the index from scratch (cached embeddings are reused)")
+    r.add_argument("--index-type", choices=INDEX_TYPES, help="ANN index type (default: the store's current setting, else auto)")
+    r.add_argument("--shard-by", choices=SHARD_KEYS, help="Shard by document type, or type and month (default: current, else type)")
+    m = sub.add_parser("migrate")
+    for sp in (r, m):
+        sp.add_argument("--dim", type=int, choices=EMBEDDING_DIMS, help="Stored vector dimension (default: current)")
+        sp.add_argument("--storage", choices=STORAGE_TYPES, help="Stored vector precision (default: current)")
+    bm = sub.add_parser("benchmark"); bm.add_argument("--queries", type=int, default=200)
+    bm.add_argument("--dims", type=int, nargs="+", default=sorted(EMBEDDING_DIMS, reverse=True))
+    bm.add_argument("--storages", nargs="+", choices=STORAGE_TYPES, default=STORAGE_TYPES)
+    for name in ("add", "update", "remove"):
+        sub.add_parser(name).add_argument("file_paths", nargs="+")
+    for name in ("rebuild", "add", "update"):
+        sp = sub.choices[name]
+        sp.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"Texts per embedding request (max {BATCH_SIZE})")
+        sp.add_argument("--workers", type=int, default=WORKERS, help="Embedding requests in flight")
     e = sub.add_parser("export"); e.add_argument("--format", choices=["json", "csv"], default="json")
 
     args = parser.parse_args()
-    if args.command == "stats": cmd_stats(args)
-    elif args.command == "search": cmd_search(args)
-    elif args.command == "rebuild": cmd_rebuild(args)
-    elif args.command == "export": cmd_export(args)
-    else: parser.print_help()
+    writes = args.command in ("rebuild", "add", "update", "remove", "migrate")
+    with writer_lock() if writes else nullcontext():
+        if args.command == "stats": cmd_stats(args)
+        elif args.command == "search": cmd_search(args)
+        elif args.command == "similar": cmd_similar(args)
+        elif args.command == "rebuild": cmd_rebuild(args)
+        elif args.command in ("add", "update"): cmd_add(args)
+        elif args.command == "remove": cmd_remove(args)
+        elif args.command == "migrate": cmd_migrate(args)
+        elif args.command == "benchmark": cmd_benchmark(args)
+        elif args.command == "export": cmd_export(args)
+        else: parser.print_help()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+AGI Knowledge Search - Index watcher daemon
+
+Keeps the vector store and the BM25 full-text index live: the three source
+trees are watched for markdown files being written, moved or deleted, bursts
+of changes are debounced, and only the affected files are re-indexed
+(vector_store.sync_store / remove_from_store, FullTextIndex.update_document).
+New generations are picked up by the API server within seconds.
+
+Changes are detected with inotify (Linux, through libc; no dependencies) on
+every directory of the trees, so an idle watcher costs nothing. Where inotify
+is unavailable, or with --poll, the corpus manifest (manifest.py) is refreshed
+every --interval seconds; only directories whose mtime changed are re-listed.
+
+On start the watcher runs one incremental sync of everything to catch up with
+changes made while it was down. Files whose embedding failed (e.g. rate
+limits) are retried after RETRY_INTERVAL seconds.
+
+Usage:
+    python watcher.py [--poll] [--interval 5] [--debounce 2] [--max-delay 30]
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from manifest import is_excluded_dir, is_source_file, load_manifest, SOURCE_DIRS
+from search import WORKSPACE
+from vector_store import file_key, get_api_key, print_counts, remove_from_store, sync_store, writer_lock
+
+DEBOUNCE = 2.0          # seconds without new events before a batch is applied
+MAX_DELAY = 30.0        # a batch is applied at the latest this long after its first event
+POLL_INTERVAL = 5.0
+RETRY_INTERVAL = 60.0
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+CHANGED, DELETED, RESCAN = "changed", "deleted", "rescan"
+
+
+def log(message: str):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+
+class InotifyWatcher:
+    """Recursive inotify watch over the source trees.
+
+    `wait(timeout)` returns {path: CHANGED | DELETED} for the markdown files
+    touched since the last call; a RESCAN entry (path None) means events were
+    lost and the caller should reconcile everything.
+    """
+
+    def __init__(self, roots: list[Path]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: dict[int, Path] = {}
+        self.known: set[Path] = set()
+        for root in roots:
+            if root.exists():
+                self._watch_tree(root)
+            else:
+                log(f"⚠️ Not watching missing directory {root}")
+
+    def _watch_tree(self, root: Path) -> list[Path]:
+        """Watch `root` and its subdirectories; returns the markdown files found in them.
+        Excluded trees (node_modules, VitePress output) are skipped, `root` included."""
+        if is_excluded_dir(root):
+            return []
+        found = []
+        for directory, subdirs, files in os.walk(root):
+            subdirs[:] = [d for d in subdirs if not is_excluded_dir(Path(directory, d))]
+            wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd >= 0:
+                self.dirs[wd] = Path(directory)
+            found.extend(Path(directory) / name for name in files)
+        found = [f for f in found if is_source_file(f)]
+        self.known.update(found)
+        return found
+
+    def _forget_tree(self, root: Path) -> list[Path]:
+        gone = [f for f in self.known if f.is_relative_to(root)]
+        self.known.difference_update(gone)
+        return gone
+
+    def wait(self, timeout: Optional[float]) -> dict:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return {}
+        data = os.read(self.fd, 64 * 1024)
+        events, pos = {}, 0
+        while pos < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, pos)
+            name = data[pos + EVENT.size:pos + EVENT.size + length].rstrip(b"\0")
+            pos += EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                events[None] = RESCAN
+                continue
+            directory = self.dirs.get(wd)
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    events.update(dict.fromkeys(self._watch_tree(path), CHANGED))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    events.update(dict.fromkeys(self._forget_tree(path), DELETED))
+            elif is_source_file(path):
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.known.discard(path)
+                    events[path] = DELETED
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self.known.add(path)
+                    events[path] = CHANGED
+        return events
+
+
+class PollingWatcher:
+    """Periodic refresh of the corpus manifest; same interface as `InotifyWatcher`."""
+
+    def __init__(self, interval: float = POLL_INTERVAL):
+        self.interval = interval
+        self.manifest = load_manifest()
+
+    def wait(self, timeout: Optional[float]) -> dict:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval if deadline is None else max(0.0, min(self.interval, deadline - time.monotonic())))
+            changes = self.manifest.refresh()
+            if self.manifest.dirty:
+                self.manifest.save()
+                self.manifest.dirty = False
+            events = {WORKSPACE / key: CHANGED for key in changes["added"] + changes["modified"]}
+            events.update((WORKSPACE / key, DELETED) for key in changes["removed"])
+            if events or (deadline is not None and time.monotonic() >= deadline):
+                return events
+
+
+def update_fulltext(changed: list[Path], deleted: list[Path]) -> int:
+    """Apply changed/deleted files to the persisted BM25 index. Returns the number of documents touched."""
+    from fulltext import FullTextIndex
+    from search import extract_metadata, extract_text
+
+    index = FullTextIndex.load()
+    touched = 0
+    for f in changed:
+        try:
+            st = f.stat()
+            content = f.read_text(encoding="utf-8")
+        except OSError:
+            continue
+        touched += index.update_document(f, extract_metadata(content), extract_text(content),
+                                         (st.st_mtime_ns, st.st_size))
+    for f in deleted:
+        touched += index.remove_document(file_key(f))
+    if touched:
+        index.save()
+    return touched
+
+
+def apply_changes(events: dict, api_key: str) -> list[Path]:
+    """Re-index the files in `events`. Returns changed files whose embedding failed."""
+    if RESCAN in events.values():
+        log("🔁 Events were dropped; reconciling all files")
+        return catch_up(api_key)
+
+    changed = [f for f, kind in events.items() if kind == CHANGED and f.is_file()]
+    deleted = [f for f, kind in events.items() if kind == DELETED or (kind == CHANGED and not f.is_file())]
+    log(f"📝 {len(changed)} changed, {len(deleted)} deleted")
+    counts = {}
+    with writer_lock():
+        removed = remove_from_store(deleted) if deleted else 0
+        if removed:
+            log(f"🗑️ Removed {removed} document(s) from the vector store")
+        if changed or removed:
+            # Also re-embeds near-duplicates of removed documents
+            counts = sync_store(changed, api_key, prune=False)
+            print_counts(counts)
+        update_fulltext(changed, deleted)
+    return changed if counts.get("failed") else []
+
+
+def catch_up(api_key: str) -> list[Path]:
+    """Incremental sync of every file (only new/changed files are embedded)."""
+    from fulltext import load_index
+
+    manifest = load_manifest()
+    files = manifest.paths()
+    with writer_lock():
+        counts = sync_store(files, api_key, manifest=manifest)
+        load_index(files)
+    print_counts(counts)
+    return files if counts["failed"] else []
+
+
+def run(watcher, api_key: str, debounce: float = DEBOUNCE, max_delay: float = MAX_DELAY):
+    retry: dict = {}
+    while True:
+        events = watcher.wait(RETRY_INTERVAL if retry else None)
+        if not events and retry:
+            events, retry = retry, {}
+        # Debounce: collect until the tree is quiet for `debounce` seconds (at most `max_delay`)
+        started = time.monotonic()
+        while events and time.monotonic() - started < max_delay:
+            more = watcher.wait(min(debounce, max_delay - (time.monotonic() - started)))
+            if not more:
+                break
+            events.update(more)
+        if events:
+            try:
+                failed = apply_changes(events, api_key)
+            except Exception as e:
+                log(f"❌ Indexing failed: {e}")
+                failed = [f for f, kind in events.items() if kind == CHANGED]
+            retry.update(dict.fromkeys(failed, CHANGED))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AGI Knowledge index watcher")
+    parser.add_argument("--poll", action="store_true", help="Poll instead of using inotify")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Polling interval in seconds")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE, help="Quiet period before indexing a burst")
+    parser.add_argument("--max-delay", type=float, default=MAX_DELAY, help="Longest a change waits for a burst to end")
+    args = parser.parse_args()
+
+    api_key = get_api_key()
+    if not api_key:
+        print("❌ No API key"); return
+
+    watcher = None
+    if not args.poll:
+        try:
+            watcher = InotifyWatcher(SOURCE_DIRS)
+            log(f"👀 Watching {len(watcher.dirs)} directories (inotify)")
+        except (OSError, AttributeError, TypeError) as e:
+            log(f"⚠️ inotify unavailable ({e}); polling every {args.interval:g}s")
+    if watcher is None:
+        watcher = PollingWatcher(args.interval)
+        log(f"👀 Polling {len(watcher.manifest.files)} files every {args.interval:g}s")
+
+    log("📚 Catching up with changes since the last run...")
+    catch_up(api_key)
+    try:
+        run(watcher, api_key, args.debounce, args.max_delay)
+    except KeyboardInterrupt:
+        log("🛑 Watcher stopped")
+
+
+if __name__ == "__main__":
+    main()